@@ -0,0 +1,181 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import threading
+import time
+import chess
+import chess.engine
+import chess.pgn
+from engine.search import search, mate_moves, MAX_DEPTH
+from engine.transp_table import TranspTable
+from engine.evaluation import MATE_SCORE
+
+
+DEFAULT_NODES = 20000
+# centipawns lost by a move, from the mover's point of view, above which it is flagged as a blunder
+BLUNDER_THRESHOLD = 200
+# scores are capped before computing the loss so that a slower mate or a still winning position is not a blunder
+LOSS_SCORE_CAP = 1000
+# games handed to the pool but not written out yet, per worker
+PENDING_PER_WORKER = 2
+
+
+def game_offsets(pgn_path: str, skip: set = frozenset()):
+    # streams the offset of every game, only the headers are parsed here
+    with open(pgn_path, encoding='utf-8', errors='replace') as pgn_file:
+        while True:
+            offset = pgn_file.tell()
+            headers = chess.pgn.read_headers(pgn_file)
+            if headers is None:
+                break
+            if offset not in skip:
+                yield offset
+
+
+def cap_score(value: int):
+    return max(min(value, LOSS_SCORE_CAP), -LOSS_SCORE_CAP)
+
+
+def terminal_score(board: chess.Board):
+    # side-to-move score of a finished game
+    return -MATE_SCORE if board.is_checkmate() else 0
+
+
+def annotate_game(task: tuple):
+    pgn_path, offset, search_args, blunder_threshold, output_format = task
+    with open(pgn_path, encoding='utf-8', errors='replace') as pgn_file:
+        pgn_file.seek(offset)
+        game = chess.pgn.read_game(pgn_file)
+    # one table per game, so every search starts from what the previous positions left in it
+    transp_table = TranspTable(search_args['transp_tab_mb'])
+    nodes = list(game.mainline())
+    board = game.board()
+    # side-to-move score and search result of every position, the final one included
+    results = []
+    sans = []
+    for ply in range(len(nodes) + 1):
+        if board.is_game_over():
+            results.append((terminal_score(board), None, 0, 0))
+        else:
+            search_info = search(board, board.turn, transp_table, search_args['q_search_depth'],
+                                 search_args['time_limit'], search_args['max_depth'],
+                                 max_nodes=search_args['max_nodes'])
+            best_move = search_info.best_move
+            results.append((search_info.score if search_info.score is not None else 0, best_move,
+                            search_info.depth, search_info.nodes + search_info.qnodes))
+        if ply < len(nodes):
+            best_move = results[ply][1]
+            sans.append((board.turn, board.san(nodes[ply].move), board.san(best_move) if best_move else None))
+            board.push(nodes[ply].move)
+
+    moves = []
+    for ply, node in enumerate(nodes):
+        turn, san, best_san = sans[ply]
+        best_score, best_move, depth, searched = results[ply]
+        # the position after the move is scored for the opponent
+        played_score = -results[ply + 1][0]
+        loss = max(cap_score(best_score) - cap_score(played_score), 0)
+        sign = 1 if turn == chess.WHITE else -1
+        moves.append({'ply': ply + 1, 'move': node.move.uci(), 'san': san,
+                      'best_move': best_move.uci() if best_move is not None else None,
+                      'score': sign * best_score, 'played_score': sign * played_score, 'loss': loss,
+                      'blunder': loss >= blunder_threshold, 'depth': depth, 'nodes': searched})
+        if output_format == 'pgn':
+            set_pgn_eval(node, sign * played_score)
+            if loss >= blunder_threshold:
+                node.nags.add(chess.pgn.NAG_BLUNDER)
+                if best_san is not None:
+                    node.comment = f'{node.comment} best {best_san}'.strip()
+    transp_table.close()
+
+    positions = sum(1 for result in results if result[1] is not None)
+    if output_format == 'pgn':
+        return offset, positions, str(game)
+    record = {'offset': offset, 'headers': dict(game.headers), 'moves': moves}
+    return offset, positions, json.dumps(record)
+
+
+def set_pgn_eval(node: chess.pgn.GameNode, value: int):
+    # set_eval writes nothing for Mate(0), the score after a mating move, so its #0 is added by hand;
+    # python-chess reads #0 back as a mate against the side to move
+    if mate_moves(value) == 0:
+        node.set_eval(None)
+        node.comment = f'{node.comment} [%eval #0]'.strip()
+    else:
+        node.set_eval(chess.engine.PovScore(pgn_score(value), chess.WHITE))
+
+
+def pgn_score(value: int):
+    moves = mate_moves(value)
+    if moves is not None:
+        return chess.engine.Mate(moves)
+    return chess.engine.Cp(value)
+
+
+def read_progress(progress_path: str):
+    if not os.path.exists(progress_path):
+        return set()
+    with open(progress_path) as f:
+        return {int(line) for line in f if line.strip()}
+
+
+def annotate(pgn_path: str, out_path: str, workers: int, search_args: dict, blunder_threshold: int = BLUNDER_THRESHOLD,
+             output_format: str = 'jsonl', resume: bool = False, max_pending: int = None):
+    # the offsets of finished games are appended to out_path.progress, a resumed run skips them and appends to
+    # out_path; a game written just before a crash can appear twice
+    progress_path = out_path + '.progress'
+    done = read_progress(progress_path) if resume else set()
+    mode = 'a' if resume else 'w'
+    # the pool feeds tasks from a separate thread, which waits here until enough results have been written
+    pending = threading.BoundedSemaphore(max_pending or workers * PENDING_PER_WORKER)
+
+    def tasks():
+        for offset in game_offsets(pgn_path, done):
+            pending.acquire()
+            yield pgn_path, offset, search_args, blunder_threshold, output_format
+
+    games = 0
+    positions = 0
+    start_time = time.time()
+    with mp.Pool(workers) as pool, open(out_path, mode) as out_file, open(progress_path, mode) as progress_file:
+        for offset, game_positions, text in pool.imap_unordered(annotate_game, tasks()):
+            pending.release()
+            out_file.write(text + ('\n\n' if output_format == 'pgn' else '\n'))
+            out_file.flush()
+            progress_file.write(f'{offset}\n')
+            progress_file.flush()
+            games += 1
+            positions += game_positions
+            elapsed = time.time() - start_time
+            print(f'Game {games} (offset {offset}): {game_positions} positions, '
+                  f'{positions / max(elapsed, 1e-9):.1f} positions/s, {elapsed:.0f} s', flush=True)
+    elapsed = time.time() - start_time
+    return {'games': games, 'skipped': len(done), 'positions': positions, 'time': round(elapsed, 3),
+            'positions_per_second': round(positions / elapsed, 2) if elapsed > 0 else 0.}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Annotate every position of a PGN file with scores, best moves '
+                                                 'and blunders')
+    parser.add_argument('pgn')
+    parser.add_argument('--out', default='annotated.jsonl', help='.pgn writes annotated PGN, anything else JSONL')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--time', type=float, help='search time per position in seconds')
+    parser.add_argument('--nodes', type=int, help=f'nodes per position, {DEFAULT_NODES} when --time is not given')
+    parser.add_argument('--depth', type=int, default=MAX_DEPTH)
+    parser.add_argument('--q-search-depth', type=int, default=2)
+    parser.add_argument('--hash', type=float, default=16, help='transposition table size per worker in MB')
+    parser.add_argument('--blunder', type=int, default=BLUNDER_THRESHOLD, help='centipawn loss of a blunder')
+    parser.add_argument('--max-pending', type=int, help='games queued ahead of the writer, 2 per worker by default')
+    parser.add_argument('--resume', action='store_true', help='skip the games listed in OUT.progress')
+    args = parser.parse_args()
+
+    max_nodes = args.nodes if args.nodes is not None or args.time is not None else DEFAULT_NODES
+    search_args = {'transp_tab_mb': args.hash, 'q_search_depth': args.q_search_depth,
+                   'time_limit': args.time if args.time is not None else float('Inf'), 'max_depth': args.depth,
+                   'max_nodes': max_nodes}
+    output_format = 'pgn' if args.out.endswith('.pgn') else 'jsonl'
+    summary = annotate(args.pgn, args.out, args.workers, search_args, args.blunder, output_format, args.resume,
+                       args.max_pending)
+    print(json.dumps(summary, indent=2))
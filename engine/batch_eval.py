@@ -0,0 +1,154 @@
+import argparse
+import itertools
+import sys
+import time
+import multiprocessing as mp
+import chess
+import numpy as np
+from engine.evaluation import BB_PIECES, BB_WEIGHTS, TOTAL_PHASE, DOUBLED_PAWN, ISOLATED_PAWN, PASSED_PAWN_MG, \
+    PASSED_PAWN_EG
+
+
+BATCH_CHUNK_SIZE = 2 ** 16
+
+# FEN placement characters in BB_PIECES order, and the expansion of a placement field into 64 squares from a8 to h1
+FEN_PIECES = np.array([ord(chess.Piece(piece_type, color).symbol()) for color, piece_type in BB_PIECES],
+                      dtype=np.uint8)
+FEN_EXPAND = str.maketrans({**{str(_empty): '.' * _empty for _empty in range(1, 9)}, '/': ''})
+# FEN order lists rank 8 first, SQUARE_FEN_INDEX maps each square to its index in the expanded placement
+SQUARE_FEN_INDEX = np.array([(7 - chess.square_rank(square)) * 8 + chess.square_file(square)
+                             for square in chess.SQUARES])
+# BYTE_TERMS[term, byte_index * 256 + byte] sums the BB_WEIGHTS column `term` over the bits set in byte `byte_index`
+# of the (N, 12) bitboards viewed as (N, 96) bytes, so every position is 96 table reads per term instead of 768
+# multiplications
+BYTE_BITS = (np.arange(256)[:, None] >> np.arange(8)) & 1
+BYTE_TERMS = np.einsum('vb,ibt->tiv', BYTE_BITS, BB_WEIGHTS.reshape(96, 8, 4)).reshape(4, -1).astype(np.int32)
+BYTE_OFFSETS = np.arange(96) * 256
+BIT_VALUES = (1 << np.arange(8)).astype(np.uint8)
+POPCOUNT8 = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.int32)
+FILE_A = np.uint64(chess.BB_FILE_A)
+FILE_H = np.uint64(chess.BB_FILE_H)
+# multiplying a byte of files by it repeats the byte on every rank
+RANK_FILL = np.uint64(0x0101010101010101)
+PASSED_BONUS_MG = np.array(PASSED_PAWN_MG, dtype=np.int32)
+PASSED_BONUS_EG = np.array(PASSED_PAWN_EG, dtype=np.int32)
+
+
+def fen_bitboards(fens: list):
+    # (N, 12) bitboards in BB_PIECES order from the placement field of FENs or EPDs
+    placements = [fen.split(' ', 1)[0].translate(FEN_EXPAND) for fen in fens]
+    for fen, placement in zip(fens, placements):
+        if len(placement) != 64:
+            raise ValueError(f'invalid FEN: {fen}')
+    chars = np.frombuffer(''.join(placements).encode('ascii'), dtype=np.uint8).reshape(-1, 64)[:, SQUARE_FEN_INDEX]
+    squares = (chars[:, None, :] == FEN_PIECES[None, :, None]).reshape(len(placements), 96, 8).view(np.uint8)
+    # much faster than np.packbits with bitorder='little'
+    return np.ascontiguousarray((squares * BIT_VALUES).sum(axis=2, dtype=np.uint8)).view('<u8')
+
+
+def popcount(bitboards: np.ndarray):
+    return POPCOUNT8[bitboards.view(np.uint8).reshape(len(bitboards), 8)].sum(axis=1)
+
+
+def file_set(pawns: np.ndarray):
+    # byte of the files holding at least one pawn
+    for shift in (32, 16, 8):
+        pawns = pawns | (pawns >> np.uint64(shift))
+    return pawns & np.uint64(0xFF)
+
+
+def adjacent_spans(span: np.ndarray):
+    return span | ((span << np.uint64(1)) & ~FILE_A) | ((span >> np.uint64(1)) & ~FILE_H)
+
+
+def pawn_structure_batch(white_pawns: np.ndarray, black_pawns: np.ndarray):
+    # pawn_structure over arrays of pawn bitboards with shifts and masks, returns the (mg, eg) arrays
+    # the squares behind each black pawn and in front of each white pawn, the passed pawns of the other side
+    # cannot stand on them or on the adjacent files
+    black_behind = black_pawns >> np.uint64(8)
+    white_ahead = white_pawns << np.uint64(8)
+    for shift in (8, 16, 32):
+        black_behind |= black_behind >> np.uint64(shift)
+        white_ahead |= white_ahead << np.uint64(shift)
+    mg_value = np.zeros(len(white_pawns), dtype=np.int32)
+    eg_value = np.zeros(len(white_pawns), dtype=np.int32)
+    for pawns, blocked, sign, ranks in ((white_pawns, adjacent_spans(black_behind), 1, slice(None)),
+                                        (black_pawns, adjacent_spans(white_ahead), -1, slice(None, None, -1))):
+        files = file_set(pawns)
+        doubled = popcount(pawns) - popcount(files)
+        isolated_files = files & ~(((files << np.uint64(1)) | (files >> np.uint64(1))) & np.uint64(0xFF))
+        isolated = popcount(pawns & (isolated_files * RANK_FILL))
+        # byte r of the passed pawns is rank r
+        passed_ranks = POPCOUNT8[(pawns & ~blocked).view(np.uint8).reshape(len(pawns), 8)]
+        mg_value += sign * (DOUBLED_PAWN[0] * doubled + ISOLATED_PAWN[0] * isolated
+                            + passed_ranks @ PASSED_BONUS_MG[ranks])
+        eg_value += sign * (DOUBLED_PAWN[1] * doubled + ISOLATED_PAWN[1] * isolated
+                            + passed_ranks @ PASSED_BONUS_EG[ranks])
+    return mg_value, eg_value
+
+
+def evaluate_bitboards_batch(bitboards: np.ndarray):
+    # evaluate_bitboards over an (N, 12) array, static evaluation only: checkmates and draws are not detected
+    bitboards = np.ascontiguousarray(bitboards, dtype='<u8')
+    byte_view = bitboards.view(np.uint8).reshape(len(bitboards), 96)
+    byte_index = byte_view + BYTE_OFFSETS
+    mg_value, eg_value, material_value, phase = (terms[byte_index].sum(axis=1) for terms in BYTE_TERMS)
+    pawn_mg, pawn_eg = pawn_structure_batch(bitboards[:, 0].copy(), bitboards[:, 6].copy())
+    phase = np.minimum(phase, TOTAL_PHASE)
+    return material_value + ((mg_value + pawn_mg) * phase + (eg_value + pawn_eg) * (TOTAL_PHASE - phase)) \
+        // TOTAL_PHASE
+
+
+def evaluate_chunk(chunk):
+    if isinstance(chunk, np.ndarray):
+        return evaluate_bitboards_batch(chunk)
+    return evaluate_bitboards_batch(fen_bitboards(chunk))
+
+
+def batch_chunks(positions, chunk_size: int):
+    if isinstance(positions, np.ndarray):
+        for start in range(0, len(positions), chunk_size):
+            yield positions[start:start + chunk_size]
+        return
+    positions = iter(positions)
+    while True:
+        chunk = list(itertools.islice(positions, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def evaluate_batch(positions, chunk_size: int = BATCH_CHUNK_SIZE, processes: int = 1):
+    # white-relative evaluations of an (N, 12) uint64 bitboard array in BB_PIECES order or of an iterable of FENs,
+    # read chunk_size positions at a time; processes > 1 spreads the chunks over a process pool
+    if isinstance(positions, np.ndarray) and (positions.ndim != 2 or positions.shape[1] != 12):
+        raise ValueError(f'expected an (N, 12) bitboard array, got shape {positions.shape}')
+    chunks = batch_chunks(positions, chunk_size)
+    if processes > 1:
+        with mp.Pool(processes) as pool:
+            # imap keeps the input order and only reads ahead of the workers by a few chunks per process
+            results = list(pool.imap(evaluate_chunk, chunks))
+    else:
+        results = [evaluate_chunk(chunk) for chunk in chunks]
+    if not results:
+        return np.zeros(0, dtype=np.int32)
+    return np.concatenate(results).astype(np.int32, copy=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluate a file of FENs or EPDs, one position per line')
+    parser.add_argument('path')
+    parser.add_argument('--out', help='write the scores to this .npy file instead of stdout')
+    parser.add_argument('--chunk-size', type=int, default=BATCH_CHUNK_SIZE)
+    parser.add_argument('--processes', type=int, default=1)
+    args = parser.parse_args()
+    start_time = time.perf_counter()
+    with open(args.path) as f:
+        scores = evaluate_batch((line for line in f if line.strip()), args.chunk_size, args.processes)
+    elapsed = time.perf_counter() - start_time
+    if args.out:
+        np.save(args.out, scores)
+    else:
+        np.savetxt(sys.stdout, scores, fmt='%d')
+    print(f'{len(scores)} positions in {elapsed:.2f} s, {len(scores) / max(elapsed, 1e-9):.0f} positions/s',
+          file=sys.stderr)
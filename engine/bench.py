@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import chess
+from engine.evaluation import evaluate_board, evaluate_board_bitboards
+from engine.batch_eval import evaluate_batch
+from engine.search import Searcher, TranspTable, SearchFeatures, DEFAULT_FEATURES, NATIVE_BOARD
+from engine.timeman import TimeManager
+
+
+BENCH_POSITIONS = {
+    'opening': [
+        chess.STARTING_FEN,
+        'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3',
+    ],
+    'middlegame': [
+        'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 10',
+        '4rrk1/pp1n3p/3q2pQ/2p1pb2/2PP4/2P3N1/P2B2PP/4RRK1 b - - 7 19',
+        'rq3rk1/ppp2ppp/1bnpb3/3N2B1/3NP3/7P/PPPQ1PP1/2KR3R w - - 7 14',
+        'r1bq1r1k/1pp1n1pp/1p1p4/4p2Q/4Pp2/1BNP4/PPP2PPP/3R1RK1 w - - 2 14',
+        'r3r1k1/2p2ppp/p1p1bn2/8/1q2P3/2NPQN2/PPP3PP/R4RK1 b - - 2 15',
+        'r1bbk1nr/pp3p1p/2n5/1N4p1/2Np1B2/8/PPP2PPP/2KR1B1R w kq - 0 13',
+        'r1bq1rk1/ppp1nppp/4n3/3p3Q/3P4/1BP1B3/PP1N2PP/R4RK1 w - - 1 16',
+        '4r1k1/r1q2ppp/ppp2n2/4P3/5Rb1/1N1BQ3/PPP3PP/R5K1 w - - 1 17',
+        '2rqkb1r/ppp2p2/2npb1p1/1N1Nn2p/2P1PP2/8/PP2B1PP/R1BQK2R b KQ - 0 11',
+        'r1bq1r1k/b1p1npp1/p2p3p/1p6/3PP3/1B2NN2/PP3PPP/R2Q1RK1 w - - 1 16',
+        '3r1rk1/p5pp/bpp1pp2/8/q1PP1P2/b3P3/P2NQRPP/1R2B1K1 b - - 6 22',
+        'r1q2rk1/2p1bppp/2Pp4/p6b/Q1PNp3/4B3/PP1R1PPP/2K4R w - - 2 18',
+        '4k2r/1pb2ppp/1p2p3/1R1p4/3P4/2r1PN2/P4PPP/1R4K1 b - - 3 22',
+        '3q2k1/pb3p1p/4pbp1/2r5/PpN2N2/1P2P2P/5PP1/Q2R2K1 b - - 4 26',
+        'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+        'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+        'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+        '5rk1/q6p/2p3bR/1pPp1rP1/1P1Pp3/P3B1Q1/1K3P2/R7 w - - 93 90',
+        '4rrk1/1p1nq3/p7/2p1P1pp/3P2bp/3Q1Bn1/PPPB4/1K2R1NR w - - 40 21',
+        'r3k2r/3nnpbp/q2pp1p1/p7/Pp1PPPP1/4BNN1/1P5P/R2Q1RK1 w kq - 0 16',
+        '3Qb1k1/1r2ppb1/pN1n2q1/Pp1Pp1Pr/4P2p/4BP2/4B1R1/1R5K b - - 11 40',
+        '4k3/3q1r2/1N2r1b1/3ppN2/2nPP3/1B1R2n1/2R1Q3/3K4 w - - 5 1',
+        '1r3k2/4q3/2Pp3b/3Bp3/2Q2p2/1p1P2P1/1P2KP2/3N4 w - - 0 1',
+        '6k1/4pp1p/3p2p1/P1pPb3/R7/1r2P1PP/3B1P2/6K1 w - - 0 1',
+    ],
+    'endgame': [
+        '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 11',
+        '6k1/6p1/6Pp/ppp5/3pn2P/1P3K2/1PP2P2/8 b - - 3 54',
+        '3b4/5kp1/1p1p1p1p/pP1PpP1P/P1P1P3/3KN3/8/8 w - - 0 1',
+        '2K5/p7/7P/5pR1/8/5k2/r7/8 w - - 0 1',
+        '8/6pk/1p6/8/PP3p1p/5P2/4KP1q/3Q4 w - - 0 1',
+        '7k/3p2pp/4q3/8/4Q3/5Kp1/P6b/8 w - - 0 1',
+        '8/2p5/8/2kPKp1p/2p4P/2P5/3P4/8 w - - 0 1',
+        '8/1p3pp1/7p/5P1P/2k3P1/8/2K2P2/8 w - - 0 1',
+        '8/pp2r1k1/2p1p3/3pP2p/1P1P1P1P/P5KR/8/8 w - - 0 1',
+        '8/3p4/p1bk3p/Pp6/1Kp1PpPp/2P2P1P/2P5/5B2 b - - 0 1',
+        '5k2/7R/4P2p/5K2/p1r2P1p/8/8/8 b - - 0 1',
+        '6k1/6p1/P6p/r1N5/5p2/7P/1b3PP1/4R1K1 w - - 0 1',
+        '8/3p3B/5p2/5P2/p7/PP5b/k7/6K1 w - - 0 1',
+        '8/8/8/8/8/4k3/4P3/4K3 w - - 0 1',
+        '8/8/8/4k3/8/8/8/R4K2 w - - 0 1',
+        '8/8/8/5k2/8/8/8/3QK3 w - - 0 1',
+        '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1',
+        '8/8/4k3/8/2p5/8/B2K4/8 w - - 0 1',
+    ],
+    'tactical': [
+        '2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - 0 1',
+        '8/7p/5k2/5p2/p1p2P2/Pr1pPK2/1P1R3P/8 b - - 0 1',
+        '5rk1/1ppb3p/p1pb4/6q1/3P1p1r/2P1R2P/PP1BQ1P1/5RKN w - - 0 1',
+        'r1bq2rk/pp3pbp/2p1p1pQ/7P/3P4/2PB1N2/PP3PP1/R3KR2 w Q - 0 1',
+        '5k2/6pp/p1qN4/1p1p4/3P4/2PKP2Q/PP3r2/3R4 b - - 0 1',
+        '7k/p7/1R5K/6r1/6p1/6P1/8/8 w - - 0 1',
+        'rnbqkb1r/pppp1ppp/8/4P3/6n1/7P/PPPNPPP1/R1BQKBNR b KQkq - 0 1',
+        'r4q1k/p2bR1rp/2p2Q1N/5p2/5p2/2P5/PP3PPP/R5K1 w - - 0 1',
+        '3q1rk1/p4pp1/2pb3p/3p4/6Pr/1PNQ4/P1PB1PP1/4RRK1 b - - 0 1',
+        '2br2k1/2q3rn/p2NppQ1/2p1P3/Pp5R/4P3/1P3PPP/3R2K1 w - - 0 1',
+    ],
+}
+BENCH_FENS = [fen for fens in BENCH_POSITIONS.values() for fen in fens]
+# modules that must stay importable without any notebook or GUI dependency, checked by tests/test_imports.py
+HEADLESS_MODULES = ('engine.core', 'engine.playing', 'engine.uci', 'engine.batch_eval')
+# asyncio comes with chess.engine and chess.pgn
+HEAVY_MODULES = ('IPython', 'matplotlib', 'PyQt5', 'asyncio')
+
+
+def effective_branching_factor(iterations: list):
+    # geometric mean of the node growth between the first and the last completed iteration
+    nodes = [iteration_nodes for iteration_nodes, _ in iterations if iteration_nodes > 0]
+    if len(nodes) < 2:
+        return None
+    return (nodes[-1] / nodes[0]) ** (1 / (len(nodes) - 1))
+
+
+def bench_position(fen: str, depth: int, q_search_depth: int, transp_table_mb: float,
+                   features: SearchFeatures = DEFAULT_FEATURES, native_board: bool = NATIVE_BOARD):
+    board = chess.Board(fen)
+    transp_table = TranspTable(transp_table_mb)
+    time_manager = TimeManager(float('Inf'))
+    searcher = Searcher(board, transp_table, q_search_depth, time_manager, features=features,
+                        native_board=native_board)
+    start_time = time.perf_counter()
+    best_move, _ = searcher.iterative_deepening(board.turn, depth)
+    elapsed = time.perf_counter() - start_time
+    nodes = searcher.nodes + searcher.qnodes
+    ebf = effective_branching_factor(time_manager.iterations)
+    return {
+        'fen': fen,
+        'best_move': best_move.uci() if best_move is not None else None,
+        'nodes': searcher.nodes,
+        'qnodes': searcher.qnodes,
+        'time': round(elapsed, 4),
+        'nps': round(nodes / elapsed) if elapsed > 0 else 0,
+        'tt_probes': transp_table.probes,
+        'tt_hits': transp_table.hits,
+        'tt_cutoffs': searcher.tt_cutoffs,
+        'tt_hit_rate': round(transp_table.hit_rate, 4),
+        'ebf': round(ebf, 3) if ebf is not None else None,
+        'first_move_cutoff_rate': round(searcher.orderer.first_move_cutoff_rate, 4),
+        'eval_probes': searcher.eval_cache.probes,
+        'eval_hits': searcher.eval_cache.hits,
+        'eval_cache_hit_rate': round(searcher.eval_cache.hit_rate, 4),
+        'pawn_probes': searcher.pawn_table.probes,
+        'pawn_hits': searcher.pawn_table.hits,
+        'pawn_hash_hit_rate': round(searcher.pawn_table.hit_rate, 4),
+        'null_move_cutoffs': searcher.null_move_cutoffs,
+        'reductions': searcher.reductions,
+        're_searches': searcher.re_searches,
+        'futility_prunes': searcher.futility_prunes,
+        'aspiration_researches': searcher.aspiration_researches,
+    }
+
+
+def run_bench(depth: int, q_search_depth: int, transp_table_mb: float, verbose: bool = True,
+              features: SearchFeatures = DEFAULT_FEATURES, native_board: bool = NATIVE_BOARD):
+    positions = []
+    for category, fens in BENCH_POSITIONS.items():
+        for fen in fens:
+            result = bench_position(fen, depth, q_search_depth, transp_table_mb, features, native_board)
+            result['category'] = category
+            positions.append(result)
+            if verbose:
+                print(f'{len(positions):>2}/{len(BENCH_FENS)} {result["best_move"] or "-":<6} '
+                      f'nodes: {result["nodes"] + result["qnodes"]:>8} nps: {result["nps"]:>6} {fen}',
+                      file=sys.stderr)
+    nodes = sum(result['nodes'] for result in positions)
+    qnodes = sum(result['qnodes'] for result in positions)
+    total_time = sum(result['time'] for result in positions)
+    probes = sum(result['tt_probes'] for result in positions)
+    hits = sum(result['tt_hits'] for result in positions)
+    eval_probes = sum(result['eval_probes'] for result in positions)
+    eval_hits = sum(result['eval_hits'] for result in positions)
+    pawn_probes = sum(result['pawn_probes'] for result in positions)
+    pawn_hits = sum(result['pawn_hits'] for result in positions)
+    return {
+        'depth': depth,
+        'q_search_depth': q_search_depth,
+        'hash_mb': transp_table_mb,
+        'features': features._asdict(),
+        'native_board': native_board,
+        'positions': positions,
+        'total': {
+            'positions': len(positions),
+            'nodes': nodes,
+            'qnodes': qnodes,
+            'time': round(total_time, 3),
+            'nps': round((nodes + qnodes) / total_time) if total_time > 0 else 0,
+            'tt_hit_rate': round(hits / probes, 4) if probes else 0.,
+            'eval_cache_hit_rate': round(eval_hits / eval_probes, 4) if eval_probes else 0.,
+            'pawn_hash_hit_rate': round(pawn_hits / pawn_probes, 4) if pawn_probes else 0.,
+            **{name: sum(result[name] for result in positions)
+               for name in ('null_move_cutoffs', 'reductions', 're_searches', 'futility_prunes',
+                            'aspiration_researches')},
+        },
+        # total node count, only changes when the search itself does: compare it across commits that should
+        # not alter search behaviour
+        'signature': nodes + qnodes,
+    }
+
+
+def time_eval(fens: list, repeat: int = 1000):
+    # microseconds per position of the per-board evaluations and of the batch API, correctness is checked by
+    # tests/test_batch_eval.py
+    boards = [chess.Board(fen) for fen in fens]
+    timings = {}
+    for eval_fn in (evaluate_board, evaluate_board_bitboards):
+        start_time = time.perf_counter()
+        for board in boards:
+            for _ in range(repeat):
+                eval_fn(board)
+        timings[eval_fn.__name__] = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    evaluate_batch(fens * repeat)
+    timings[evaluate_batch.__name__] = time.perf_counter() - start_time
+    return {name: round(elapsed / (repeat * len(fens)) * 1e6, 2) for name, elapsed in timings.items()}
+
+
+def time_imports(modules: tuple = HEADLESS_MODULES, repeat: int = 5):
+    # milliseconds to import each module in a fresh interpreter, the fastest of `repeat` runs
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings = {}
+    for module in modules:
+        code = (f'import time; start_time = time.perf_counter(); import {module}; '
+                f'print(time.perf_counter() - start_time)')
+        elapsed = min(float(subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True,
+                                           check=True).stdout) for _ in range(repeat))
+        timings[module] = round(elapsed * 1e3, 1)
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search a fixed set of positions and report search statistics as JSON')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--q-search-depth', type=int, default=2)
+    parser.add_argument('--hash', type=float, default=16, help='transposition table size in MB')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--quiet', action='store_true', help='do not print per-position progress')
+    parser.add_argument('--disable', nargs='+', default=[], choices=SearchFeatures._fields,
+                        help='selective search features turned off, to measure what each of them saves')
+    parser.add_argument('--eval', action='store_true',
+                        help='time the static evaluations on the bench positions in us/call instead of searching')
+    parser.add_argument('--imports', action='store_true',
+                        help='time the import of the headless modules in ms instead of searching')
+    parser.add_argument('--native-board', action='store_true',
+                        help='search on engine.movegen.Position instead of chess.Board, the signature must not change')
+    args = parser.parse_args()
+    if args.imports:
+        print(json.dumps(time_imports(), indent=2))
+        sys.exit(0)
+    if args.eval:
+        print(json.dumps(time_eval(BENCH_FENS), indent=2))
+        sys.exit(0)
+    features = DEFAULT_FEATURES._replace(**{name: False for name in args.disable})
+    report = run_bench(args.depth, args.q_search_depth, args.hash, verbose=not args.quiet, features=features,
+                       native_board=args.native_board)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    print(f'Nodes searched: {report["signature"]}, nps: {report["total"]["nps"]}', file=sys.stderr)
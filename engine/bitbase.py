@@ -0,0 +1,224 @@
+import argparse
+import mmap
+import os
+import time
+from array import array
+import chess
+import numpy as np
+from engine.evaluation import piece_values
+from engine.movegen import KING_ATTACKS, bishop_attacks, rook_attacks
+
+
+DEFAULT_BITBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bitbases')
+# K + piece vs K, generated in this order since promotions in KPK look up KQK and KRK
+ENDGAMES = {'kqk': chess.QUEEN, 'krk': chess.ROOK, 'kpk': chess.PAWN}
+NUM_POSITIONS = 2 * 64 * 64 * 64
+# scores of bitbase wins, above any evaluation and below the mate scores
+BITBASE_WIN = 20000
+
+
+def bitbase_index(strong_to_move: bool, strong_king: int, weak_king: int, piece_square: int):
+    # squares are seen from the strong side, which is white or mirrored to white
+    return (((0 if strong_to_move else 1) * 64 + strong_king) * 64 + weak_king) * 64 + piece_square
+
+
+def piece_attacks(piece_type: int, square: int, occupied: int):
+    if piece_type == chess.ROOK:
+        return rook_attacks(square, occupied)
+    if piece_type == chess.QUEEN:
+        return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+    return chess.BB_PAWN_ATTACKS[chess.WHITE][square]
+
+
+def piece_moves(piece_type: int, square: int, occupied: int):
+    if piece_type != chess.PAWN:
+        return piece_attacks(piece_type, square, occupied) & ~occupied
+    # pawn pushes only, the lone king is the only piece that could be captured
+    moves = 0
+    if not occupied & chess.BB_SQUARES[square + 8]:
+        moves |= chess.BB_SQUARES[square + 8]
+        if square < 16 and not occupied & chess.BB_SQUARES[square + 16]:
+            moves |= chess.BB_SQUARES[square + 16]
+    return moves
+
+
+def generate(piece_type: int, promotion_tables: dict = None):
+    # retrograde analysis: a strong-to-move position is won if one move reaches a won weak-to-move position,
+    # a weak-to-move position is won if every move reaches a won strong-to-move position (or it is mate)
+    half = NUM_POSITIONS // 2
+    strong_win = np.zeros(half, dtype=bool)
+    weak_mated = np.zeros(half, dtype=bool)
+    strong_positions, strong_starts, strong_successors = array('i'), array('i'), array('i')
+    weak_positions, weak_starts, weak_successors = array('i'), array('i'), array('i')
+    for strong_king in range(64):
+        for weak_king in range(64):
+            if weak_king == strong_king or KING_ATTACKS[strong_king] & chess.BB_SQUARES[weak_king]:
+                continue
+            for square in range(64):
+                if square in (strong_king, weak_king):
+                    continue
+                if piece_type == chess.PAWN and not 8 <= square < 56:
+                    continue
+                index = (strong_king * 64 + weak_king) * 64 + square
+                kings = chess.BB_SQUARES[strong_king] | chess.BB_SQUARES[weak_king]
+                occupied = kings | chess.BB_SQUARES[square]
+
+                # weak side to move
+                weak_in_check = bool(piece_attacks(piece_type, square, kings) & chess.BB_SQUARES[weak_king])
+                successors = []
+                escapes = False
+                for to_square in chess.scan_forward(KING_ATTACKS[weak_king] & ~KING_ATTACKS[strong_king]):
+                    if to_square == square:
+                        # the piece is captured, a draw
+                        escapes = True
+                    elif not piece_attacks(piece_type, square, chess.BB_SQUARES[strong_king]) \
+                            & chess.BB_SQUARES[to_square]:
+                        successors.append((strong_king * 64 + to_square) * 64 + square)
+                if not escapes:
+                    if successors:
+                        weak_positions.append(index)
+                        weak_starts.append(len(weak_successors))
+                        weak_successors.extend(successors)
+                    elif weak_in_check:
+                        weak_mated[index] = True
+
+                # strong side to move, illegal if the weak king is in check
+                if weak_in_check:
+                    continue
+                successors = []
+                for to_square in chess.scan_forward(KING_ATTACKS[strong_king] & ~KING_ATTACKS[weak_king]
+                                                    & ~chess.BB_SQUARES[square]):
+                    successors.append((to_square * 64 + weak_king) * 64 + square)
+                for to_square in chess.scan_forward(piece_moves(piece_type, square, occupied)):
+                    if piece_type == chess.PAWN and to_square >= 56:
+                        promotion_index = (strong_king * 64 + weak_king) * 64 + to_square
+                        if any(table[promotion_index] for table in promotion_tables.values()):
+                            strong_win[index] = True
+                    else:
+                        successors.append((strong_king * 64 + weak_king) * 64 + to_square)
+                if successors:
+                    strong_positions.append(index)
+                    strong_starts.append(len(strong_successors))
+                    strong_successors.extend(successors)
+
+    strong_positions = np.frombuffer(strong_positions, dtype=np.int32)
+    strong_starts = np.frombuffer(strong_starts, dtype=np.int32)
+    strong_successors = np.frombuffer(strong_successors, dtype=np.int32)
+    weak_positions = np.frombuffer(weak_positions, dtype=np.int32)
+    weak_starts = np.frombuffer(weak_starts, dtype=np.int32)
+    weak_successors = np.frombuffer(weak_successors, dtype=np.int32)
+    weak_win = weak_mated.copy()
+    while True:
+        weak_win[weak_positions] = np.logical_and.reduceat(strong_win[weak_successors], weak_starts)
+        new_strong_win = strong_win.copy()
+        new_strong_win[strong_positions] |= np.logical_or.reduceat(weak_win[strong_successors], strong_starts)
+        if np.array_equal(new_strong_win, strong_win):
+            break
+        strong_win = new_strong_win
+    return np.concatenate([strong_win, weak_win])
+
+
+def bitbase_path(directory: str, name: str):
+    return os.path.join(directory, f'{name}.bb')
+
+
+def generate_all(directory: str = DEFAULT_BITBASE_DIR, verbose: bool = True):
+    os.makedirs(directory, exist_ok=True)
+    tables = {}
+    for name, piece_type in ENDGAMES.items():
+        start_time = time.time()
+        # a promotion leaves the weak side to move
+        promotion_tables = {other: table[NUM_POSITIONS // 2:] for other, table in tables.items()}
+        table = generate(piece_type, promotion_tables)
+        tables[name] = table
+        np.packbits(table, bitorder='little').tofile(bitbase_path(directory, name))
+        if verbose:
+            print(f'{name}: {int(table.sum())} won positions, {time.time() - start_time:.1f} s')
+    return tables
+
+
+class Bitbases(object):
+    def __init__(self, directory: str = DEFAULT_BITBASE_DIR):
+        self.directory = directory
+        self.files = []
+        # tables[piece_type]: packed bits indexed by bitbase_index
+        self.tables = {}
+        for name, piece_type in ENDGAMES.items():
+            path = bitbase_path(directory, name)
+            if os.path.exists(path) and os.path.getsize(path) == NUM_POSITIONS // 8:
+                f = open(path, 'rb')
+                self.files.append(f)
+                self.tables[piece_type] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def load(cls, directory: str = DEFAULT_BITBASE_DIR):
+        bitbases = cls(directory)
+        if not bitbases.tables:
+            bitbases.close()
+            return None
+        return bitbases
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for f in self.files:
+            f.close()
+        self.tables = {}
+        self.files = []
+
+    def lookup(self, board: chess.Board):
+        # (strong color, piece type, strong side wins) or None when the position is not covered
+        if chess.popcount(board.occupied) != 3:
+            return None
+        square = chess.lsb(board.occupied & ~board.kings)
+        piece_type = board.piece_type_at(square)
+        table = self.tables.get(piece_type)
+        if table is None:
+            return None
+        strong = board.color_at(square)
+        strong_king = board.king(strong)
+        weak_king = board.king(not strong)
+        if strong == chess.BLACK:
+            strong_king, weak_king, square = strong_king ^ 56, weak_king ^ 56, square ^ 56
+        index = bitbase_index(board.turn == strong, strong_king, weak_king, square)
+        return strong, piece_type, bool(table[index >> 3] >> (index & 7) & 1)
+
+    def probe(self, board: chess.Board):
+        # 1 win, 0 draw, -1 loss for the side to move, None when the position is not covered
+        result = self.lookup(board)
+        if result is None:
+            return None
+        strong, _, strong_wins = result
+        if not strong_wins:
+            return 0
+        return 1 if board.turn == strong else -1
+
+    def probe_value(self, board: chess.Board):
+        # white-relative score of a covered position
+        result = self.lookup(board)
+        if result is None:
+            return None
+        strong, piece_type, strong_wins = result
+        if not strong_wins:
+            return 0
+        value = BITBASE_WIN + piece_values[piece_type] + progress(board, strong, piece_type)
+        return value if strong == chess.WHITE else -value
+
+
+def progress(board: chess.Board, strong: bool, piece_type: int):
+    # steers a won position towards mate or promotion since every winning move scores the same otherwise
+    strong_king = board.king(strong)
+    weak_king = board.king(not strong)
+    if piece_type == chess.PAWN:
+        pawn = chess.lsb(board.pawns)
+        return 20 * (chess.square_rank(pawn) if strong == chess.WHITE else 7 - chess.square_rank(pawn))
+    center_distance = max(3 - chess.square_file(weak_king), chess.square_file(weak_king) - 4) \
+        + max(3 - chess.square_rank(weak_king), chess.square_rank(weak_king) - 4)
+    return 10 * center_distance + 4 * (14 - chess.square_manhattan_distance(strong_king, weak_king))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the KQK, KRK and KPK win/draw bitbases')
+    parser.add_argument('--out', default=DEFAULT_BITBASE_DIR)
+    args = parser.parse_args()
+    generate_all(args.out)
@@ -0,0 +1,114 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+import chess
+from chess.polyglot import zobrist_hash
+
+
+# polyglot entry: key, move, weight, learn, big-endian, sorted by key
+ENTRY_STRUCT = struct.Struct('>QHHI')
+KEY_STRUCT = struct.Struct('>Q')
+ENTRY_SIZE = ENTRY_STRUCT.size
+MAX_WEIGHT = 0xFFFF
+DEFAULT_MAX_PLY = 24
+# polyglot writes castling as the king capturing its own rook
+CASTLING_TO_POLYGLOT = {
+    (chess.E1, chess.G1): chess.H1,
+    (chess.E1, chess.C1): chess.A1,
+    (chess.E8, chess.G8): chess.H8,
+    (chess.E8, chess.C8): chess.A8,
+}
+POLYGLOT_TO_CASTLING = {(from_square, rook): to_square
+                        for (from_square, to_square), rook in CASTLING_TO_POLYGLOT.items()}
+
+
+def encode_polyglot_move(board: chess.Board, move: chess.Move):
+    to_square = move.to_square
+    if board.is_castling(move):
+        to_square = CASTLING_TO_POLYGLOT[(move.from_square, move.to_square)]
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | move.from_square << 6 | promotion << 12
+
+
+def decode_polyglot_move(board: chess.Board, code: int):
+    from_square = (code >> 6) & 63
+    to_square = code & 63
+    promotion = (code >> 12) & 7
+    if board.piece_type_at(from_square) == chess.KING and (from_square, to_square) in POLYGLOT_TO_CASTLING:
+        to_square = POLYGLOT_TO_CASTLING[(from_square, to_square)]
+    return chess.Move(from_square, to_square, promotion + 1 if promotion else None)
+
+
+class OpeningBook(object):
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.num_entries = size // ENTRY_SIZE
+        # an empty file cannot be mapped
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.num_entries else b''
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = b''
+        self.num_entries = 0
+        self.file.close()
+
+    def first_index(self, key: int):
+        # binary search for the first entry whose key is not lower than key
+        data = self.data
+        low, high = 0, self.num_entries
+        while low < high:
+            middle = (low + high) // 2
+            if KEY_STRUCT.unpack_from(data, middle * ENTRY_SIZE)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, key: int):
+        data = self.data
+        index = self.first_index(key)
+        while index < self.num_entries:
+            entry_key, move, weight, _ = ENTRY_STRUCT.unpack_from(data, index * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            yield move, weight
+            index += 1
+
+    def moves(self, board: chess.Board):
+        # legal (move, weight) pairs stored for the position
+        moves = []
+        for code, weight in self.entries(zobrist_hash(board)):
+            move = decode_polyglot_move(board, code)
+            if weight > 0 and board.is_legal(move):
+                moves.append((move, weight))
+        return moves
+
+    def choose(self, board: chess.Board, weighted_random: bool = True):
+        moves = self.moves(board)
+        if not moves:
+            return None
+        if weighted_random:
+            return random.choices([move for move, _ in moves], weights=[weight for _, weight in moves])[0]
+        return max(moves, key=lambda item: item[1])[0]
+
+
+if __name__ == '__main__':
+    # the PGN reader is only needed to build books, not to probe them
+    from engine.book_builder import build_book, DEFAULT_MIN_GAMES
+
+    parser = argparse.ArgumentParser(description='Build a polyglot opening book from PGN files')
+    parser.add_argument('pgn', nargs='+')
+    parser.add_argument('--out', default='book.bin')
+    parser.add_argument('--max-ply', type=int, default=DEFAULT_MAX_PLY, help='plies of every game added to the book')
+    parser.add_argument('--min-games', type=int, default=DEFAULT_MIN_GAMES, help='games a move must appear in')
+    parser.add_argument('--min-weight', type=int, default=1, help='minimum 2 * wins + draws of a move')
+    args = parser.parse_args()
+    start_time = time.time()
+    games, entries = build_book(args.pgn, args.out, args.max_ply, args.min_games, args.min_weight)
+    print(f'{games} games, {entries} entries written to {args.out} in {time.time() - start_time:.1f} s')
@@ -0,0 +1,75 @@
+import chess
+import chess.pgn
+from chess.polyglot import zobrist_hash
+from engine.book import ENTRY_STRUCT, MAX_WEIGHT, DEFAULT_MAX_PLY, encode_polyglot_move
+
+
+RESULT_POINTS = {'1-0': (0, 2), '0-1': (2, 0), '1/2-1/2': (1, 1)}
+# a move seen in a single game is left out of the book
+DEFAULT_MIN_GAMES = 2
+
+
+class BookVisitor(chess.pgn.BaseVisitor):
+    # collects (key, polyglot move, side to move) for the first max_ply moves of the main line
+    def __init__(self, max_ply: int = DEFAULT_MAX_PLY):
+        self.max_ply = max_ply
+
+    def begin_game(self):
+        self.game_result = None
+        self.moves = []
+
+    def visit_header(self, tagname: str, tagvalue: str):
+        if tagname == 'Result':
+            self.game_result = tagvalue
+
+    def end_headers(self):
+        if self.game_result not in RESULT_POINTS:
+            return chess.pgn.SKIP
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def visit_move(self, board: chess.Board, move: chess.Move):
+        if len(self.moves) < self.max_ply:
+            self.moves.append((zobrist_hash(board), encode_polyglot_move(board, move), board.turn))
+
+    def result(self):
+        return self.game_result, self.moves
+
+
+def read_book_games(pgn_path: str, max_ply: int = DEFAULT_MAX_PLY):
+    with open(pgn_path, encoding='utf-8', errors='replace') as pgn_file:
+        while True:
+            game = chess.pgn.read_game(pgn_file, Visitor=lambda: BookVisitor(max_ply))
+            if game is None:
+                break
+            result, moves = game
+            if result in RESULT_POINTS and moves:
+                yield result, moves
+
+
+def build_book(pgn_paths: list, book_path: str, max_ply: int = DEFAULT_MAX_PLY, min_games: int = DEFAULT_MIN_GAMES,
+               min_weight: int = 1):
+    # weight = 2 per win + 1 per draw for the side that played the move
+    stats = {}
+    games = 0
+    for pgn_path in pgn_paths:
+        for result, moves in read_book_games(pgn_path, max_ply):
+            games += 1
+            black_points, white_points = RESULT_POINTS[result]
+            for key, move, turn in moves:
+                entry = stats.get((key, move))
+                if entry is None:
+                    entry = stats[(key, move)] = [0, 0]
+                entry[0] += 1
+                entry[1] += white_points if turn == chess.WHITE else black_points
+    entries = [(key, move, weight) for (key, move), (count, weight) in stats.items()
+               if count >= min_games and weight >= min_weight]
+    # weights are scaled down together so the most played move still fits 16 bits
+    max_weight = max((weight for _, _, weight in entries), default=0)
+    scale = MAX_WEIGHT / max_weight if max_weight > MAX_WEIGHT else 1.
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    with open(book_path, 'wb') as f:
+        for key, move, weight in entries:
+            f.write(ENTRY_STRUCT.pack(key, move, max(int(weight * scale), 1), 0))
+    return games, len(entries)
@@ -0,0 +1,194 @@
+import argparse
+import os
+import numpy as np
+from engine.transp_table import TranspTableRes, decode_move, num_buckets_for
+
+
+CACHE_MAGIC = 0x4341594853534143
+CACHE_VERSION = 2
+DEFAULT_CACHE_MB = 64
+# only results at least this deep are worth keeping across games
+MIN_CACHE_DEPTH = 2
+CACHE_BUCKET_SIZE = 4
+# the file is synced to disk every SYNC_INTERVAL updates and on close
+SYNC_INTERVAL = 16
+
+CACHE_HEADER = np.dtype([('magic', '<u8'), ('version', '<u4'), ('num_buckets', '<u4'), ('session', '<u4'),
+                         ('reserved', '<u4', (11,))])
+# 20 bytes per slot, session is the last session that stored or refreshed the entry
+CACHE_ENTRY = np.dtype([('key', '<u8'), ('score', '<i4'), ('move', '<u2'), ('depth', 'i1'), ('flag', 'u1'),
+                        ('session', '<u4')])
+
+
+class AnalysisCache(object):
+    # persistent set-associative table of deep search results, memory-mapped from a fixed-size file,
+    # written by a single engine process
+    # size_mb None keeps the size of an existing cache, read_only opens one for inspection; a new session, which ages
+    # the stored entries by one, is only started by the engines that write their results
+    def __init__(self, path: str, size_mb: float = DEFAULT_CACHE_MB, min_depth: int = MIN_CACHE_DEPTH,
+                 read_only: bool = False, new_session: bool = True):
+        self.path = path
+        self.min_depth = min_depth
+        header = self.read_header(path) if size_mb is None or read_only else None
+        if header is not None:
+            num_buckets = int(header['num_buckets'])
+        elif read_only:
+            raise ValueError(f'{path} is not an analysis cache of version {CACHE_VERSION}')
+        else:
+            num_buckets = num_buckets_for(DEFAULT_CACHE_MB if size_mb is None else size_mb,
+                                          CACHE_BUCKET_SIZE * CACHE_ENTRY.itemsize)
+        num_bytes = CACHE_HEADER.itemsize + num_buckets * CACHE_BUCKET_SIZE * CACHE_ENTRY.itemsize
+        old_entries = None
+        if not read_only and os.path.exists(path):
+            old_entries = self.read_entries(path, num_buckets, num_bytes)
+        if old_entries is not None or not os.path.exists(path):
+            # new file, or one written with another size or version whose entries are hashed again below
+            with open(path, 'wb') as f:
+                f.truncate(num_bytes)
+        self.mmap = np.memmap(path, dtype=np.uint8, mode='r' if read_only else 'r+', shape=(num_bytes,))
+        self.header = np.ndarray((), dtype=CACHE_HEADER, buffer=self.mmap)
+        self.entries = np.ndarray(num_buckets * CACHE_BUCKET_SIZE, dtype=CACHE_ENTRY, buffer=self.mmap,
+                                  offset=CACHE_HEADER.itemsize)
+        if self.header['magic'] != CACHE_MAGIC:
+            self.header['magic'] = CACHE_MAGIC
+            self.header['version'] = CACHE_VERSION
+            self.header['num_buckets'] = num_buckets
+            if old_entries is not None and old_entries.size:
+                # entries keep their age when the file is resized
+                self.header['session'] = old_entries['session'].max()
+        self.keys, self.depths = self.entries['key'], self.entries['depth']
+        self.flags, self.sessions = self.entries['flag'], self.entries['session']
+        if new_session and not read_only:
+            self.header['session'] += 1
+        self.session = int(self.header['session'])
+        self.mask = num_buckets - 1
+        self.updates = 0
+        self.stores = 0
+        self.evictions = 0
+        if old_entries is not None:
+            for entry in old_entries[np.argsort(old_entries['depth'], kind='stable')]:
+                self.store(int(entry['key']), int(entry['score']), int(entry['move']), int(entry['depth']),
+                           int(entry['flag']), int(entry['session']))
+
+    @staticmethod
+    def read_header(path: str):
+        # the header of an existing cache of this version, else None
+        if not os.path.exists(path) or os.path.getsize(path) < CACHE_HEADER.itemsize:
+            return None
+        header = np.fromfile(path, dtype=CACHE_HEADER, count=1)[0]
+        if header['magic'] != CACHE_MAGIC or header['version'] != CACHE_VERSION:
+            return None
+        return header
+
+    @staticmethod
+    def read_entries(path: str, num_buckets: int, num_bytes: int):
+        # the occupied entries of a file that does not match the requested layout, None if it matches
+        data = np.fromfile(path, dtype=np.uint8)
+        if data.size == 0:
+            return np.zeros(0, dtype=CACHE_ENTRY)
+        header = data[:CACHE_HEADER.itemsize].view(CACHE_HEADER)[0] if data.size >= CACHE_HEADER.itemsize else None
+        if header is None or header['magic'] != CACHE_MAGIC:
+            # never truncate a file that is not a cache, such as a book passed by mistake
+            raise ValueError(f'{path} is not an analysis cache')
+        if header['version'] == CACHE_VERSION:
+            if header['num_buckets'] == num_buckets and data.size == num_bytes:
+                return None
+            size = int(header['num_buckets']) * CACHE_BUCKET_SIZE * CACHE_ENTRY.itemsize
+            entries = data[CACHE_HEADER.itemsize:CACHE_HEADER.itemsize + size].view(CACHE_ENTRY)
+            return entries[entries['flag'] != 0].copy()
+        return np.zeros(0, dtype=CACHE_ENTRY)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.flags))
+
+    @property
+    def size_mb(self):
+        return self.mmap.nbytes / 2 ** 20
+
+    def sync(self):
+        if self.mmap is not None:
+            self.mmap.flush()
+
+    def close(self):
+        if self.mmap is not None:
+            self.sync()
+            # the file is unmapped once the last view is gone
+            self.header = self.entries = None
+            self.keys = self.depths = self.flags = self.sessions = None
+            self.mmap = None
+
+    def store(self, key: int, score: int, move: int, depth: int, flag: int, session: int = None):
+        if session is None:
+            session = self.session
+        keys, depths, flags, sessions = self.keys, self.depths, self.flags, self.sessions
+        idx = (key & self.mask) * CACHE_BUCKET_SIZE
+        bucket = range(idx, idx + CACHE_BUCKET_SIZE)
+        victim = None
+        for i in bucket:
+            if flags[i] != 0 and keys[i] == key:
+                if depth < depths[i]:
+                    # keep the deeper result but mark it as still in use
+                    sessions[i] = max(int(sessions[i]), session)
+                    return False
+                victim = i
+                break
+        if victim is None:
+            victim = next((i for i in bucket if flags[i] == 0), None)
+        if victim is None:
+            # an entry loses one ply of priority for every session since it was last stored
+            victim = min(bucket, key=lambda i: int(depths[i]) - (self.session - int(sessions[i])))
+            if int(depths[victim]) - (self.session - int(sessions[victim])) > depth:
+                return False
+            self.evictions += 1
+        self.entries[victim] = (key, score, move, depth, flag, session)
+        self.stores += 1
+        return True
+
+    def lookup(self, key: int):
+        idx = (key & self.mask) * CACHE_BUCKET_SIZE
+        for i in range(idx, idx + CACHE_BUCKET_SIZE):
+            if self.flags[i] != 0 and self.keys[i] == key:
+                entry = self.entries[i]
+                return TranspTableRes(int(entry['score']), int(entry['flag']), int(entry['depth']),
+                                      decode_move(int(entry['move'])))
+        return None
+
+    def update(self, transp_table):
+        # flushes the deep entries written by the last search of transp_table
+        stored = 0
+        for key, score, move, depth, flag in zip(*(column.tolist() for column in
+                                                   transp_table.export(self.min_depth))):
+            stored += self.store(key, score, move, depth, flag)
+        self.updates += 1
+        if self.updates % SYNC_INTERVAL == 0:
+            self.sync()
+        return stored
+
+    def warm_start(self, transp_table):
+        # copies every cached entry into transp_table, the deepest one wins when two share a bucket
+        entries = self.entries[self.flags != 0]
+        if entries.size == 0:
+            return 0
+        entries = entries[np.argsort(entries['depth'], kind='stable')]
+        transp_table.load(entries['key'], entries['score'], entries['move'], entries['depth'], entries['flag'])
+        return entries.size
+
+
+def cache_stats(cache: AnalysisCache):
+    entries = cache.entries[cache.flags != 0]
+    depths, counts = np.unique(entries['depth'], return_counts=True)
+    return {'path': cache.path, 'size_mb': round(cache.size_mb, 3), 'slots': cache.entries.size,
+            'entries': int(entries.size), 'sessions': cache.session,
+            'depths': {int(depth): int(count) for depth, count in zip(depths, counts)}}
+
+
+if __name__ == '__main__':
+    import json
+
+    parser = argparse.ArgumentParser(description='Show or resize a persistent analysis cache')
+    parser.add_argument('path')
+    parser.add_argument('--size', type=float, help='resize the cache to this many MB, it is only shown when omitted')
+    args = parser.parse_args()
+    analysis_cache = AnalysisCache(args.path, args.size, read_only=args.size is None, new_session=False)
+    print(json.dumps(cache_stats(analysis_cache), indent=2))
+    analysis_cache.close()
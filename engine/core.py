@@ -0,0 +1,104 @@
+import os
+from engine.search import search, SearchInfo, TranspTable, MAX_DEPTH, Q_SEARCH_CHECKS, DEFAULT_FEATURES
+from engine.smp import LazySMP
+from engine.book import OpeningBook
+from engine.bitbase import Bitbases, DEFAULT_BITBASE_DIR
+from engine.cache import AnalysisCache, DEFAULT_CACHE_MB
+from engine.profiling import Profiler, SAMPLE_INTERVAL
+
+
+class Engine():
+    def __init__(self, time_limit, q_search_depth, transp_table_mb, threads=1, profile_dir=None,
+                 profile_interval=SAMPLE_INTERVAL, book_path=None, bitbase_dir=DEFAULT_BITBASE_DIR, cache_path=None,
+                 cache_mb=DEFAULT_CACHE_MB, q_search_checks=Q_SEARCH_CHECKS, features=DEFAULT_FEATURES):
+        super().__init__()
+        self.time_limit = time_limit
+        self.q_search_depth = q_search_depth
+        self.q_search_checks = q_search_checks
+        # SearchFeatures toggling null-move pruning, late move reductions and futility pruning
+        self.features = features
+        # polyglot book consulted before every search
+        self.book = OpeningBook(book_path) if book_path else None
+        # KQK/KRK/KPK bitbases, None until generated with python -m engine.bitbase
+        self.bitbases = Bitbases.load(bitbase_dir) if bitbase_dir else None
+        # when set, every move is profiled and saved as profile_dir/move_NNNN.collapsed and .json
+        self.profile_dir = profile_dir
+        self.profile_interval = profile_interval
+        self.profiled_moves = 0
+        self.last_profile = None
+        # persistent results of earlier games, opened before any helper process is started since it may raise
+        self.cache = AnalysisCache(cache_path, cache_mb) if cache_path else None
+        self.smp = None
+        if threads > 1:
+            self.smp = LazySMP(threads, transp_table_mb, bitbase_dir if self.bitbases is not None else None)
+            self.transp_table = self.smp.transp_table
+        else:
+            self.transp_table = TranspTable(transp_table_mb)
+        # loaded into the table now, the results of a search are flushed to it by flush_cache
+        self.cache_pending = False
+        if self.cache is not None:
+            self.cache.warm_start(self.transp_table)
+
+    def flush_cache(self):
+        # copies the deep entries of the last search into the analysis cache, a scan of the whole table, so the UCI
+        # front end calls it once bestmove is sent; otherwise it runs before the next search or on clear and close
+        if self.cache is not None and self.cache_pending:
+            self.cache.update(self.transp_table)
+        self.cache_pending = False
+
+    def clear(self):
+        self.flush_cache()
+        self.transp_table.clear()
+        if self.cache is not None:
+            self.cache.warm_start(self.transp_table)
+
+    def play(self, board, stop_event=None, on_iteration=None, time_limit=None, max_depth=MAX_DEPTH, max_nodes=None):
+        if self.book is not None:
+            book_move = self.book.choose(board)
+            if book_move is not None:
+                return SearchInfo(book_move, None, 0, 0, 0, 0, 0, 0, 0, 0., 0., 0, 0., [], [book_move], 0.)
+        if self.profile_dir is None:
+            return self.search(board, stop_event, on_iteration, time_limit, max_depth, max_nodes)
+        os.makedirs(self.profile_dir, exist_ok=True)
+        with Profiler(self.profile_interval) as profiler:
+            search_info = self.search(board, stop_event, on_iteration, time_limit, max_depth, max_nodes)
+        self.profiled_moves += 1
+        path_prefix = os.path.join(self.profile_dir, f'move_{self.profiled_moves:04d}')
+        self.last_profile = profiler.save(path_prefix, path=path_prefix, fen=board.fen(),
+                                          best_move=search_info.best_move.uci() if search_info.best_move else None,
+                                          depth=search_info.depth, nodes=search_info.nodes,
+                                          qnodes=search_info.qnodes)
+        return search_info
+
+    def search(self, board, stop_event, on_iteration, time_limit, max_depth, max_nodes):
+        if time_limit is None:
+            time_limit = self.time_limit
+        # the entries of the previous search are told apart by their generation, which this search moves on
+        self.flush_cache()
+        if self.smp is not None:
+            search_info = self.smp.search(board, board.turn, self.q_search_depth, time_limit, max_depth=max_depth,
+                                          stop_event=stop_event, on_iteration=on_iteration, max_nodes=max_nodes,
+                                          bitbases=self.bitbases, q_search_checks=self.q_search_checks,
+                                          features=self.features)
+        else:
+            search_info = search(board, board.turn, self.transp_table, self.q_search_depth, time_limit,
+                                 max_depth=max_depth, stop_event=stop_event, on_iteration=on_iteration,
+                                 max_nodes=max_nodes, bitbases=self.bitbases, q_search_checks=self.q_search_checks,
+                                 features=self.features)
+        self.cache_pending = True
+        return search_info
+
+    def close(self):
+        if self.cache is not None:
+            self.flush_cache()
+            self.cache.close()
+            self.cache = None
+        if self.smp is not None:
+            self.smp.close()
+            self.smp = None
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+        if self.bitbases is not None:
+            self.bitbases.close()
+            self.bitbases = None
@@ -0,0 +1,54 @@
+from engine.evaluation import pawn_structure
+
+
+EVAL_CACHE_SIZE = 2 ** 16
+PAWN_HASH_SIZE = 2 ** 14
+
+
+class EvalCache(object):
+    # fixed-size, always-replace table of static evaluations keyed by zobrist hash; plain lists since
+    # it is private to one searcher and indexing them is much cheaper than numpy scalars
+    def __init__(self, size: int = EVAL_CACHE_SIZE):
+        self.mask = size - 1
+        # -1 is never a valid key, so empty slots cannot match
+        self.keys = [-1] * size
+        self.values = [None] * size
+        self.probes = 0
+        self.hits = 0
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.
+
+    def clear(self):
+        size = self.mask + 1
+        self.keys = [-1] * size
+        self.values = [None] * size
+        self.probes = 0
+        self.hits = 0
+
+    def lookup(self, key: int):
+        self.probes += 1
+        idx = key & self.mask
+        if self.keys[idx] == key:
+            self.hits += 1
+            return self.values[idx]
+        return None
+
+    def store(self, key: int, value):
+        idx = key & self.mask
+        self.keys[idx] = key
+        self.values[idx] = value
+
+
+class PawnHashTable(EvalCache):
+    # (midgame, endgame) pawn structure terms keyed by the pawn-only zobrist key
+    def __init__(self, size: int = PAWN_HASH_SIZE):
+        super().__init__(size)
+
+    def evaluate(self, key: int, white_pawns: int, black_pawns: int):
+        terms = self.lookup(key)
+        if terms is None:
+            terms = pawn_structure(white_pawns, black_pawns)
+            self.store(key, terms)
+        return terms
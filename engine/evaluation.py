@@ -1,4 +1,6 @@
 import chess
+from engine.zobrist import CASTLING_ROOKS, PIECE_KEYS
+import numpy as np
 
 
 piece_values = {
@@ -93,36 +95,6 @@ kingEvalEndGameWhite = [
 kingEvalEndGameBlack = list(reversed(kingEvalEndGameWhite))
 
 
-white_queen = chess.Piece.from_symbol('Q')
-black_queen = chess.Piece.from_symbol('q')
-white_knight = chess.Piece.from_symbol('N')
-black_knight = chess.Piece.from_symbol('n')
-white_bishop = chess.Piece.from_symbol('B')
-black_bishop = chess.Piece.from_symbol('b')
-
-
-def is_endgame(board: chess.Board):
-    piece_map = board.piece_map()
-    pieces = piece_map.values()
-    end_game = False
-    if (not white_queen in pieces) and (not black_queen in pieces):
-        end_game = True
-    else:
-        white_minors = 0
-        if white_knight in pieces:
-            white_minors += 1
-        if white_bishop in pieces:
-            white_minors += 1
-        black_minors = 0
-        if black_knight in pieces:
-            black_minors += 1
-        if black_bishop in pieces:
-            black_minors += 1
-        if ((white_queen in pieces) and (white_minors < 2)) or ((black_queen in pieces) and (black_minors < 2)):
-            end_game = True
-    return end_game
-
-
 def evaluate_piece_square(piece: chess.Piece, square: chess.Square, end_game: bool):
     piece_type = piece.piece_type
     if piece.color == chess.WHITE:
@@ -156,52 +128,191 @@ def evaluate_piece_square(piece: chess.Piece, square: chess.Square, end_game: bo
             else:
                 return -kingEvalEndGameBlack[square]
 
+# midgame/endgame piece-square values indexed as [color][piece_type][square], already signed
+# from White's point of view; the two sets only differ for the king
+MG_PST = [[[0] * 64 for _ in range(7)] for _ in chess.COLORS]
+EG_PST = [[[0] * 64 for _ in range(7)] for _ in chess.COLORS]
+MATERIAL = [[0] * 7 for _ in chess.COLORS]
+for _color in chess.COLORS:
+    for _piece_type in chess.PIECE_TYPES:
+        _piece = chess.Piece(_piece_type, _color)
+        MATERIAL[_color][_piece_type] = piece_values[_piece_type] if _color == chess.WHITE else -piece_values[_piece_type]
+        for _square in chess.SQUARES:
+            MG_PST[_color][_piece_type][_square] = evaluate_piece_square(_piece, _square, False)
+            EG_PST[_color][_piece_type][_square] = evaluate_piece_square(_piece, _square, True)
+
+# score of a checkmate, the search subtracts the distance to it in plies
+MATE_SCORE = 32000
+
+PHASE_WEIGHTS = [0, 0, 1, 1, 2, 4, 0]
+TOTAL_PHASE = 24
+
+# pawn structure terms as (midgame, endgame), passed pawn bonuses are indexed by the rank seen from the pawn's side
+DOUBLED_PAWN = (-10, -20)
+ISOLATED_PAWN = (-10, -15)
+PASSED_PAWN_MG = [0, 5, 10, 15, 25, 40, 60, 0]
+PASSED_PAWN_EG = [0, 10, 15, 25, 40, 65, 100, 0]
+ADJACENT_FILES = [(chess.BB_FILES[_file - 1] if _file > 0 else 0) | (chess.BB_FILES[_file + 1] if _file < 7 else 0)
+                  for _file in range(8)]
+# squares in front of a pawn on its own and the adjacent files, where an enemy pawn stops it from being passed
+PASSED_MASKS = [[0] * 64 for _ in chess.COLORS]
+for _square in chess.SQUARES:
+    _files = chess.BB_FILES[chess.square_file(_square)] | ADJACENT_FILES[chess.square_file(_square)]
+    _rank = chess.square_rank(_square)
+    PASSED_MASKS[chess.WHITE][_square] = _files & ~((1 << (8 * (_rank + 1))) - 1)
+    PASSED_MASKS[chess.BLACK][_square] = _files & ((1 << (8 * _rank)) - 1)
+
+
+def pawn_structure(white_pawns: int, black_pawns: int):
+    # white-relative (midgame, endgame) value of the doubled, isolated and passed pawns
+    mg_value = 0
+    eg_value = 0
+    for color, pawns, enemy_pawns, sign in ((chess.WHITE, white_pawns, black_pawns, 1),
+                                            (chess.BLACK, black_pawns, white_pawns, -1)):
+        for file_mask in chess.BB_FILES:
+            count = chess.popcount(pawns & file_mask)
+            if count > 1:
+                mg_value += sign * DOUBLED_PAWN[0] * (count - 1)
+                eg_value += sign * DOUBLED_PAWN[1] * (count - 1)
+        for square in chess.scan_forward(pawns):
+            if not pawns & ADJACENT_FILES[chess.square_file(square)]:
+                mg_value += sign * ISOLATED_PAWN[0]
+                eg_value += sign * ISOLATED_PAWN[1]
+            if not enemy_pawns & PASSED_MASKS[color][square]:
+                rank = chess.square_rank(square) if color == chess.WHITE else 7 - chess.square_rank(square)
+                mg_value += sign * PASSED_PAWN_MG[rank]
+                eg_value += sign * PASSED_PAWN_EG[rank]
+    return mg_value, eg_value
+
+
+def pawn_key(board: chess.Board):
+    # the pawn part of the zobrist key
+    key = 0
+    for color in chess.COLORS:
+        for square in chess.scan_forward(board.pawns & board.occupied_co[color]):
+            key ^= PIECE_KEYS[color][chess.PAWN][square]
+    return key
+
+
+def taper(material_value: int, mg_value: int, eg_value: int, phase: int):
+    phase = min(phase, TOTAL_PHASE)
+    return material_value + (mg_value * phase + eg_value * (TOTAL_PHASE - phase)) // TOTAL_PHASE
+
+
+class Evaluator(object):
+    def __init__(self, board: chess.Board, pawn_table=None):
+        # pawn structure terms are read through pawn_table (a PawnHashTable) when one is given
+        self.pawn_table = pawn_table
+        self.reset(board)
+
+    def reset(self, board: chess.Board):
+        self.board = board
+        self.mg, self.eg, self.material, self.phase = bitboard_terms(board_bitboards(board))
+        self.pawn_key = pawn_key(board)
+        self.stack = []
+
+    def _add(self, color: bool, piece_type: int, square: int):
+        self.material += MATERIAL[color][piece_type]
+        self.mg += MG_PST[color][piece_type][square]
+        self.eg += EG_PST[color][piece_type][square]
+        self.phase += PHASE_WEIGHTS[piece_type]
+        if piece_type == chess.PAWN:
+            self.pawn_key ^= PIECE_KEYS[color][chess.PAWN][square]
+
+    def _remove(self, color: bool, piece_type: int, square: int):
+        self.material -= MATERIAL[color][piece_type]
+        self.mg -= MG_PST[color][piece_type][square]
+        self.eg -= EG_PST[color][piece_type][square]
+        self.phase -= PHASE_WEIGHTS[piece_type]
+        if piece_type == chess.PAWN:
+            self.pawn_key ^= PIECE_KEYS[color][chess.PAWN][square]
+
+    def make(self, board: chess.Board, move: chess.Move):
+        # must be called before board.push(move)
+        self.stack.append((self.material, self.mg, self.eg, self.phase, self.pawn_key))
+        turn = board.turn
+        from_square = move.from_square
+        to_square = move.to_square
+        piece_type = board.piece_type_at(from_square)
+        captured = board.piece_type_at(to_square)
+        if captured is not None:
+            self._remove(not turn, captured, to_square)
+        elif piece_type == chess.PAWN and to_square == board.ep_square:
+            self._remove(not turn, chess.PAWN, to_square - 8 if turn == chess.WHITE else to_square + 8)
+        elif piece_type == chess.KING and abs(to_square - from_square) == 2:
+            rook_from, rook_to = CASTLING_ROOKS[to_square]
+            mg_pst = MG_PST[turn][chess.ROOK]
+            eg_pst = EG_PST[turn][chess.ROOK]
+            self.mg += mg_pst[rook_to] - mg_pst[rook_from]
+            self.eg += eg_pst[rook_to] - eg_pst[rook_from]
+        self._remove(turn, piece_type, from_square)
+        self._add(turn, move.promotion if move.promotion is not None else piece_type, to_square)
+
+    def unmake(self):
+        self.material, self.mg, self.eg, self.phase, self.pawn_key = self.stack.pop()
+
+    def evaluate(self):
+        board = self.board
+        white_pawns = board.pawns & board.occupied_co[chess.WHITE]
+        black_pawns = board.pawns & board.occupied_co[chess.BLACK]
+        if self.pawn_table is not None:
+            pawn_mg, pawn_eg = self.pawn_table.evaluate(self.pawn_key, white_pawns, black_pawns)
+        else:
+            pawn_mg, pawn_eg = pawn_structure(white_pawns, black_pawns)
+        return taper(self.material, self.mg + pawn_mg, self.eg + pawn_eg, self.phase)
+
 
 def evaluate_board(board: chess.Board):
     if not board.is_game_over():
         material_value = 0
-        piece_square_value = 0
-        piece_map = board.piece_map()
-        # checking end-game
-        end_game = is_endgame(board)
-        # calculating board_value
-        for square in piece_map.keys():
-            piece = piece_map[square]
+        mg_value = 0
+        eg_value = 0
+        phase = 0
+        for square, piece in board.piece_map().items():
             piece_type = piece.piece_type
-            if piece.color == chess.WHITE:
-                material_value += piece_values[piece_type]
-            else:
-                material_value -= piece_values[piece_type]
-            piece_square_value += evaluate_piece_square(piece, square, end_game)
-        board_value = material_value + piece_square_value
-        return board_value
+            color = piece.color
+            material_value += MATERIAL[color][piece_type]
+            mg_value += MG_PST[color][piece_type][square]
+            eg_value += EG_PST[color][piece_type][square]
+            phase += PHASE_WEIGHTS[piece_type]
+        pawn_mg, pawn_eg = pawn_structure(board.pawns & board.occupied_co[chess.WHITE],
+                                          board.pawns & board.occupied_co[chess.BLACK])
+        return taper(material_value, mg_value + pawn_mg, eg_value + pawn_eg, phase)
     else:
         winner = board.outcome().winner
         if winner is not None:
             if winner:
-                return float('Inf')
-            return -float('Inf')
+                return MATE_SCORE
+            return -MATE_SCORE
         return 0
 
 
-def evaluate_move(board: chess.Board, piece_map: dict, end_game: bool, move: chess.Move):
-    from_quare = move.from_square
-    to_square = move.to_square
-    piece = piece_map[from_quare]
-    if move.promotion is not None:
-        if piece.color == chess.WHITE:
-            return piece_values[move.promotion]
-        return -piece_values[move.promotion]
-    else:
-        from_piece_square = evaluate_piece_square(piece, from_quare, end_game)
-        to_piece_square = evaluate_piece_square(piece, to_square, end_game)
-        move_value = to_piece_square - from_piece_square
-        if board.is_capture(move):
-            if board.is_en_passant(move):
-                return piece_values[chess.PAWN] + move_value
-            _to = board.piece_at(move.to_square)
-            _from = board.piece_at(move.from_square)
-            move_value += (piece_values[_to.piece_type] - piece_values[_from.piece_type])
-        return move_value
+# the twelve piece bitboards in the order (WHITE, PAWN..KING), (BLACK, PAWN..KING)
+BB_PIECES = [(color, piece_type) for color in (chess.WHITE, chess.BLACK) for piece_type in chess.PIECE_TYPES]
+# one row per (piece, square) bit with columns midgame PST, endgame PST, material and phase; the
+# last two repeat the piece value on every square, so multiplying by the bits yields popcount * value
+BB_WEIGHTS = np.array([[MG_PST[color][piece_type][square], EG_PST[color][piece_type][square],
+                        MATERIAL[color][piece_type], PHASE_WEIGHTS[piece_type]]
+                       for color, piece_type in BB_PIECES for square in chess.SQUARES], dtype=np.int32)
+
+
+def board_bitboards(board: chess.Board):
+    return np.array([board.pieces_mask(piece_type, color) for color, piece_type in BB_PIECES], dtype='<u8')
+
 
+def bitboard_terms(bitboards: np.ndarray):
+    # little-endian bytes unpacked with bitorder='little' give bit i == square i of each board
+    squares = np.unpackbits(bitboards.view(np.uint8), bitorder='little')
+    return (squares @ BB_WEIGHTS).tolist()
 
+
+def evaluate_bitboards(bitboards: np.ndarray):
+    mg_value, eg_value, material_value, phase = bitboard_terms(bitboards)
+    pawn_mg, pawn_eg = pawn_structure(int(bitboards[0]), int(bitboards[6]))
+    return taper(material_value, mg_value + pawn_mg, eg_value + pawn_eg, phase)
+
+
+def evaluate_board_bitboards(board: chess.Board):
+    if not board.is_game_over():
+        return evaluate_bitboards(board_bitboards(board))
+    return evaluate_board(board)
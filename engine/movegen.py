@@ -0,0 +1,686 @@
+import argparse
+import sys
+import time
+import chess
+from chess import BB_ALL, BB_SQUARES, BB_FILE_A, BB_RANK_1, BB_RANK_8, scan_reversed
+from engine.transp_table import encode_move, decode_move
+from engine.zobrist import PIECE_KEYS, CASTLING_KEYS, CASTLING_MASK, CASTLING_ROOKS, EP_KEYS, TURN_KEY
+
+
+# moves are plain ints with the transposition table layout: from | to << 6 | promotion << 12, 0 is the null move
+MOVE_BUFFER_SIZE = 256
+PROMOTIONS = (chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT)
+
+# (rook square needed in the castling rights, squares that must be empty, squares the king crosses, king move),
+# king side first like python-chess
+CASTLING_MOVES = {
+    chess.WHITE: (
+        (chess.BB_H1, chess.BB_F1 | chess.BB_G1, (chess.E1, chess.F1), chess.E1 | chess.G1 << 6),
+        (chess.BB_A1, chess.BB_B1 | chess.BB_C1 | chess.BB_D1, (chess.E1, chess.D1), chess.E1 | chess.C1 << 6),
+    ),
+    chess.BLACK: (
+        (chess.BB_H8, chess.BB_F8 | chess.BB_G8, (chess.E8, chess.F8), chess.E8 | chess.G8 << 6),
+        (chess.BB_A8, chess.BB_B8 | chess.BB_C8 | chess.BB_D8, (chess.E8, chess.D8), chess.E8 | chess.C8 << 6),
+    ),
+}
+
+
+def _step_attacks(square: int, deltas: tuple):
+    attacks = 0
+    file, rank = square & 7, square >> 3
+    for file_delta, rank_delta in deltas:
+        to_file, to_rank = file + file_delta, rank + rank_delta
+        if 0 <= to_file < 8 and 0 <= to_rank < 8:
+            attacks |= BB_SQUARES[to_rank * 8 + to_file]
+    return attacks
+
+
+def _ray_attacks(square: int, occupied: int, deltas: tuple):
+    attacks = 0
+    for file_delta, rank_delta in deltas:
+        file, rank = (square & 7) + file_delta, (square >> 3) + rank_delta
+        while 0 <= file < 8 and 0 <= rank < 8:
+            attacks |= BB_SQUARES[rank * 8 + file]
+            if occupied & BB_SQUARES[rank * 8 + file]:
+                break
+            file, rank = file + file_delta, rank + rank_delta
+    return attacks
+
+
+KNIGHT_DELTAS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+KING_DELTAS = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))
+KNIGHT_ATTACKS = [_step_attacks(square, KNIGHT_DELTAS) for square in range(64)]
+KING_ATTACKS = [_step_attacks(square, KING_DELTAS) for square in range(64)]
+# PAWN_ATTACKS[color][square]: squares attacked by a pawn of that color
+PAWN_ATTACKS = [[_step_attacks(square, ((-1, -1), (1, -1))) for square in range(64)],
+                [_step_attacks(square, ((-1, 1), (1, 1))) for square in range(64)]]
+
+# Kindergarten sliding attacks: the six inner occupancy bits of a line are gathered into the top six bits
+# by a multiplication, and the resulting index looks up the attacks of a precomputed first-rank or a-file table.
+RANK_MASKS = [BB_RANK_1 << (8 * (square >> 3)) for square in range(64)]
+DIAG_MASKS = [_ray_attacks(square, 0, ((1, 1), (-1, -1))) | BB_SQUARES[square] for square in range(64)]
+ANTI_DIAG_MASKS = [_ray_attacks(square, 0, ((1, -1), (-1, 1))) | BB_SQUARES[square] for square in range(64)]
+B_FILE_MULT = 0x0202020202020202
+FILE_MULT = 0x0004081020408000
+# FILL_UP_ATTACKS[file][inner occupancy]: first-rank attacks copied onto every rank
+FILL_UP_ATTACKS = [[_ray_attacks(file, occupancy << 1, ((1, 0), (-1, 0))) * BB_FILE_A for occupancy in range(64)]
+                   for file in range(8)]
+# A_FILE_ATTACKS[rank][inner occupancy]: attacks of a slider on the a-file
+A_FILE_ATTACKS = [[0] * 64 for _ in range(8)]
+for _rank in range(8):
+    for _occupancy in range(64):
+        _occupied = 0
+        for _i in range(6):
+            if _occupancy & (1 << _i):
+                _occupied |= BB_SQUARES[(_i + 1) * 8]
+        A_FILE_ATTACKS[_rank][_occupancy] = _ray_attacks(_rank * 8, _occupied, ((0, 1), (0, -1)))
+
+
+def bishop_attacks(square: int, occupied: int):
+    fill_up = FILL_UP_ATTACKS[square & 7]
+    diag_mask = DIAG_MASKS[square]
+    anti_diag_mask = ANTI_DIAG_MASKS[square]
+    return fill_up[((occupied & diag_mask) * B_FILE_MULT & BB_ALL) >> 58] & diag_mask \
+        | fill_up[((occupied & anti_diag_mask) * B_FILE_MULT & BB_ALL) >> 58] & anti_diag_mask
+
+
+def rook_attacks(square: int, occupied: int):
+    file = square & 7
+    rank_mask = RANK_MASKS[square]
+    rank_attacks = FILL_UP_ATTACKS[file][((occupied & rank_mask) * B_FILE_MULT & BB_ALL) >> 58] & rank_mask
+    file_occupancy = ((BB_FILE_A & (occupied >> file)) * FILE_MULT & BB_ALL) >> 58
+    return rank_attacks | A_FILE_ATTACKS[square >> 3][file_occupancy] << file
+
+
+
+
+class Position(object):
+    # Engine-internal board with integer bitboards and a mailbox. make/unmake work on int moves and a preallocated
+    # buffer, while the chess.Board methods below, which take and return chess.Move, make it a drop-in for the board
+    # of Searcher. Legal moves are listed in the order of python-chess, so both boards search the same tree.
+    __slots__ = ('pieces', 'occupied_co', 'mailbox', 'turn', 'castling_rights', 'ep_square', 'halfmove_clock',
+                 'fullmove_number', 'key', 'stack', 'move_stack', 'buffer', 'legal', 'legal_key',
+                 'check', 'check_key')
+
+    def __init__(self, fen: str = chess.STARTING_FEN):
+        self.set_board(chess.Board(fen))
+
+    @classmethod
+    def from_board(cls, board: chess.Board):
+        position = cls.__new__(cls)
+        position.set_board(board)
+        return position
+
+    def set_board(self, board: chess.Board):
+        # pieces[color][piece_type] bitboards, colors indexed like python-chess (BLACK = 0, WHITE = 1)
+        self.pieces = [[0] * 7 for _ in chess.COLORS]
+        self.occupied_co = [0, 0]
+        # mailbox[square]: piece_type | color << 3, 0 when empty
+        self.mailbox = [0] * 64
+        for square, piece in board.piece_map().items():
+            self.pieces[piece.color][piece.piece_type] |= BB_SQUARES[square]
+            self.occupied_co[piece.color] |= BB_SQUARES[square]
+            self.mailbox[square] = piece.piece_type | piece.color << 3
+        self.turn = board.turn
+        self.castling_rights = board.clean_castling_rights() & CASTLING_MASK
+        self.ep_square = board.ep_square
+        self.halfmove_clock = board.halfmove_clock
+        self.fullmove_number = board.fullmove_number
+        # (move, captured, castling_rights, ep_square, halfmove_clock, key) of every make
+        self.stack = []
+        # the chess.Move of every push, like chess.Board.move_stack
+        self.move_stack = []
+        self.buffer = [0] * MOVE_BUFFER_SIZE
+        self.key = self.compute_key()
+        # legal moves of the position with key legal_key
+        self.legal = []
+        self.legal_key = None
+        self.check = False
+        self.check_key = None
+
+    def to_board(self):
+        return chess.Board(self.fen())
+
+    def fen(self):
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ''
+            empty = 0
+            for file in range(8):
+                code = self.mailbox[rank * 8 + file]
+                if code:
+                    if empty:
+                        row += str(empty)
+                        empty = 0
+                    row += chess.Piece(code & 7, bool(code >> 3)).symbol()
+                else:
+                    empty += 1
+            rows.append(row + (str(empty) if empty else ''))
+        castling = ''.join(symbol for bb, symbol in ((chess.BB_H1, 'K'), (chess.BB_A1, 'Q'), (chess.BB_H8, 'k'),
+                                                     (chess.BB_A8, 'q')) if self.castling_rights & bb) or '-'
+        ep = chess.SQUARE_NAMES[self.ep_square] if self.ep_square is not None else '-'
+        return f'{"/".join(rows)} {"w" if self.turn else "b"} {castling} {ep} ' \
+               f'{self.halfmove_clock} {self.fullmove_number}'
+
+    def ep_key(self):
+        # polyglot only hashes the en passant file when a pawn of the side to move can capture
+        if self.ep_square is not None and PAWN_ATTACKS[not self.turn][self.ep_square] \
+                & self.pieces[self.turn][chess.PAWN]:
+            return EP_KEYS[self.ep_square & 7]
+        return 0
+
+    def compute_key(self):
+        key = 0
+        for square, code in enumerate(self.mailbox):
+            if code:
+                key ^= PIECE_KEYS[code >> 3][code & 7][square]
+        key ^= CASTLING_KEYS[self.castling_rights] ^ self.ep_key()
+        if self.turn == chess.WHITE:
+            key ^= TURN_KEY
+        return key
+
+    @property
+    def occupied(self):
+        return self.occupied_co[0] | self.occupied_co[1]
+
+    @property
+    def pawns(self):
+        return self.pieces[0][chess.PAWN] | self.pieces[1][chess.PAWN]
+
+    @property
+    def knights(self):
+        return self.pieces[0][chess.KNIGHT] | self.pieces[1][chess.KNIGHT]
+
+    @property
+    def bishops(self):
+        return self.pieces[0][chess.BISHOP] | self.pieces[1][chess.BISHOP]
+
+    @property
+    def rooks(self):
+        return self.pieces[0][chess.ROOK] | self.pieces[1][chess.ROOK]
+
+    @property
+    def queens(self):
+        return self.pieces[0][chess.QUEEN] | self.pieces[1][chess.QUEEN]
+
+    @property
+    def kings(self):
+        return self.pieces[0][chess.KING] | self.pieces[1][chess.KING]
+
+    def pieces_mask(self, piece_type: int, color: bool):
+        return self.pieces[color][piece_type]
+
+    def piece_type_at(self, square: int):
+        return self.mailbox[square] & 7 or None
+
+    def color_at(self, square: int):
+        code = self.mailbox[square]
+        return bool(code >> 3) if code else None
+
+    def king(self, color: bool):
+        king = self.pieces[color][chess.KING]
+        return king.bit_length() - 1 if king else None
+
+    def is_attacked(self, square: int, color: bool, occupied: int = None):
+        # occupied overrides the board occupancy for the sliders, so a king can be taken off its square
+        pieces = self.pieces[color]
+        if KNIGHT_ATTACKS[square] & pieces[chess.KNIGHT] or KING_ATTACKS[square] & pieces[chess.KING] \
+                or PAWN_ATTACKS[not color][square] & pieces[chess.PAWN]:
+            return True
+        if occupied is None:
+            occupied = self.occupied_co[0] | self.occupied_co[1]
+        queens = pieces[chess.QUEEN]
+        return bool(bishop_attacks(square, occupied) & (pieces[chess.BISHOP] | queens)
+                    or rook_attacks(square, occupied) & (pieces[chess.ROOK] | queens))
+
+    def is_check(self):
+        # kept for the current key, generation and the search both ask for it
+        if self.check_key != self.key:
+            king = self.pieces[self.turn][chess.KING]
+            self.check = bool(king) and self.is_attacked(king.bit_length() - 1, not self.turn)
+            self.check_key = self.key
+        return self.check
+
+    def generate_moves(self, buffer: list, from_mask: int = BB_ALL, to_mask: int = BB_ALL):
+        # pseudo-legal moves written into buffer in the order of python-chess, returns how many; legality is checked
+        # by make
+        turn = self.turn
+        pieces = self.pieces[turn]
+        mailbox = self.mailbox
+        own = self.occupied_co[turn]
+        their = self.occupied_co[not turn]
+        occupied = own | their
+        targets = ~own & to_mask & BB_ALL
+        n = 0
+
+        non_pawns = own & ~pieces[chess.PAWN] & from_mask
+        in_check = self.is_check()
+        if in_check:
+            # python-chess lists the king evasions first
+            for from_square in scan_reversed(pieces[chess.KING] & from_mask):
+                for to_square in scan_reversed(KING_ATTACKS[from_square] & targets):
+                    buffer[n] = from_square | to_square << 6
+                    n += 1
+            non_pawns &= ~pieces[chess.KING]
+        while non_pawns:
+            # scan_reversed inlined, this is the hottest loop of the generator
+            from_square = non_pawns.bit_length() - 1
+            non_pawns ^= BB_SQUARES[from_square]
+            piece_type = mailbox[from_square] & 7
+            if piece_type == chess.KNIGHT:
+                attacks = KNIGHT_ATTACKS[from_square]
+            elif piece_type == chess.BISHOP:
+                attacks = bishop_attacks(from_square, occupied)
+            elif piece_type == chess.ROOK:
+                attacks = rook_attacks(from_square, occupied)
+            elif piece_type == chess.QUEEN:
+                attacks = bishop_attacks(from_square, occupied) | rook_attacks(from_square, occupied)
+            else:
+                attacks = KING_ATTACKS[from_square]
+            attacks &= targets
+            while attacks:
+                to_square = attacks.bit_length() - 1
+                attacks ^= BB_SQUARES[to_square]
+                buffer[n] = from_square | to_square << 6
+                n += 1
+
+        if not in_check and pieces[chess.KING] & from_mask \
+                and self.castling_rights & (BB_RANK_1 if turn == chess.WHITE else BB_RANK_8):
+            for rook_bb, empty, crossed, move in CASTLING_MOVES[turn]:
+                # python-chess masks castling by the rook square, the destination is left to make
+                if self.castling_rights & rook_bb & to_mask and not occupied & empty \
+                        and not any(self.is_attacked(square, not turn) for square in crossed):
+                    buffer[n] = move
+                    n += 1
+
+        pawns = pieces[chess.PAWN] & from_mask
+        if turn == chess.WHITE:
+            single = (pawns << 8) & ~occupied & BB_ALL
+            double = (single << 8) & ~occupied & chess.BB_RANK_4
+            push = 8
+            promotion_rank = BB_RANK_8
+        else:
+            single = (pawns >> 8) & ~occupied
+            double = (single >> 8) & ~occupied & chess.BB_RANK_5
+            push = -8
+            promotion_rank = BB_RANK_1
+        pawn_attacks = PAWN_ATTACKS[turn]
+        for from_square in scan_reversed(pawns):
+            for to_square in scan_reversed(pawn_attacks[from_square] & their & to_mask):
+                if BB_SQUARES[to_square] & promotion_rank:
+                    for promotion in PROMOTIONS:
+                        buffer[n] = from_square | to_square << 6 | promotion << 12
+                        n += 1
+                else:
+                    buffer[n] = from_square | to_square << 6
+                    n += 1
+        single &= to_mask
+        while single:
+            to_square = single.bit_length() - 1
+            single ^= BB_SQUARES[to_square]
+            from_square = to_square - push
+            if BB_SQUARES[to_square] & promotion_rank:
+                for promotion in PROMOTIONS:
+                    buffer[n] = from_square | to_square << 6 | promotion << 12
+                    n += 1
+            else:
+                buffer[n] = from_square | to_square << 6
+                n += 1
+        for to_square in scan_reversed(double & to_mask):
+            buffer[n] = (to_square - 2 * push) | to_square << 6
+            n += 1
+        ep_square = self.ep_square
+        if ep_square is not None and BB_SQUARES[ep_square] & to_mask & ~occupied:
+            for from_square in scan_reversed(pawns & PAWN_ATTACKS[not turn][ep_square]):
+                buffer[n] = from_square | ep_square << 6
+                n += 1
+        return n
+
+    def legal_codes(self, from_mask: int = BB_ALL, to_mask: int = BB_ALL):
+        # the legal int moves from from_mask to to_mask, castling is masked by the rook square like python-chess;
+        # the full list is kept for the current key, since a node asks for all of its moves more than once
+        if from_mask != BB_ALL or to_mask != BB_ALL:
+            return self.generate_legal(from_mask, to_mask)
+        if self.legal_key != self.key:
+            self.legal = self.generate_legal()
+            self.legal_key = self.key
+        return self.legal
+
+    def has_legal_move(self):
+        if self.legal_key == self.key:
+            return bool(self.legal)
+        # one piece at a time, like the lazy generator of python-chess, the first piece tried usually has a move
+        own = self.occupied_co[self.turn]
+        while own:
+            square = own.bit_length() - 1
+            own ^= BB_SQUARES[square]
+            if self.generate_legal(BB_SQUARES[square], first=True):
+                return True
+        return False
+
+    def generate_legal(self, from_mask: int = BB_ALL, to_mask: int = BB_ALL, first: bool = False):
+        # like python-chess, king moves are tested with the king off the board, pinned pieces must stay on the line
+        # through their king, evasions must capture or block a single checker and only en passant captures are
+        # tested with a make; first stops at the first legal move
+        turn = self.turn
+        buffer = self.buffer
+        n = self.generate_moves(buffer, from_mask, to_mask)
+        king = self.pieces[turn][chess.KING]
+        if not king:
+            return buffer[:n]
+        king_square = king.bit_length() - 1
+        mailbox = self.mailbox
+        ep_square = self.ep_square
+        their = self.pieces[not turn]
+        occupied = self.occupied_co[0] | self.occupied_co[1]
+        diagonal = their[chess.BISHOP] | their[chess.QUEEN]
+        straight = their[chess.ROOK] | their[chess.QUEEN]
+        evasions = BB_ALL
+        if self.is_check():
+            checkers = KNIGHT_ATTACKS[king_square] & their[chess.KNIGHT] \
+                | PAWN_ATTACKS[turn][king_square] & their[chess.PAWN] \
+                | bishop_attacks(king_square, occupied) & diagonal | rook_attacks(king_square, occupied) & straight
+            if checkers & (checkers - 1):
+                evasions = 0
+            else:
+                evasions = chess.between(king_square, checkers.bit_length() - 1) | checkers
+        pinned = 0
+        snipers = bishop_attacks(king_square, 0) & diagonal | rook_attacks(king_square, 0) & straight
+        for sniper in scan_reversed(snipers):
+            blockers = chess.between(king_square, sniper) & occupied
+            if blockers and not blockers & (blockers - 1):
+                pinned |= blockers
+        pinned &= self.occupied_co[turn]
+        king_occupied = occupied & ~king
+        rays = chess.BB_RAYS[king_square]
+        codes = []
+        for i in range(n):
+            move = buffer[i]
+            from_square = move & 63
+            to_square = (move >> 6) & 63
+            if from_square == king_square:
+                if self.is_attacked(to_square, not turn, king_occupied):
+                    continue
+            elif to_square == ep_square and mailbox[from_square] & 7 == chess.PAWN:
+                if not self.make(move):
+                    continue
+                self.unmake()
+            elif not BB_SQUARES[to_square] & evasions \
+                    or BB_SQUARES[from_square] & pinned and not rays[from_square] & BB_SQUARES[to_square]:
+                continue
+            codes.append(move)
+            if first:
+                break
+        return codes
+
+    @property
+    def legal_moves(self):
+        return [decode_move(move) for move in self.legal_codes()]
+
+    def generate_legal_moves(self, from_mask: int = BB_ALL, to_mask: int = BB_ALL):
+        return [decode_move(move) for move in self.legal_codes(from_mask, to_mask)]
+
+    def generate_legal_captures(self, from_mask: int = BB_ALL, to_mask: int = BB_ALL):
+        moves = self.generate_legal_moves(from_mask, to_mask & self.occupied_co[not self.turn])
+        if self.ep_square is not None:
+            moves.extend(self.generate_legal_moves(from_mask & self.pieces[self.turn][chess.PAWN],
+                                                   to_mask & BB_SQUARES[self.ep_square]))
+        return moves
+
+    def is_legal(self, move: chess.Move):
+        return bool(move) and encode_move(move) in self.legal_codes(BB_SQUARES[move.from_square])
+
+    def is_en_passant(self, move: chess.Move):
+        return move.to_square == self.ep_square and self.mailbox[move.from_square] & 7 == chess.PAWN \
+            and abs(move.to_square - move.from_square) in (7, 9) and not self.mailbox[move.to_square]
+
+    def gives_check(self, move: chess.Move):
+        self.make(encode_move(move))
+        check = self.is_check()
+        self.unmake()
+        return check
+
+    def is_checkmate(self):
+        return self.is_check() and not self.has_legal_move()
+
+    def is_insufficient_material(self):
+        # same rules as chess.Board.has_insufficient_material for both sides
+        occupied_co = self.occupied_co
+        bishops = self.bishops
+        for color in chess.COLORS:
+            own = occupied_co[color]
+            if own & (self.pawns | self.rooks | self.queens):
+                return False
+            if own & self.knights:
+                if chess.popcount(own) > 2 or occupied_co[not color] & ~self.kings & ~self.queens:
+                    return False
+            elif own & bishops:
+                same_color = not bishops & chess.BB_DARK_SQUARES or not bishops & chess.BB_LIGHT_SQUARES
+                if not same_color or self.pawns or self.knights:
+                    return False
+        return True
+
+    def is_fivefold_repetition(self):
+        # the key of the position stored four times since the last irreversible move, pushed here
+        if self.halfmove_clock < 16:
+            return False
+        count = 1
+        for entry in self.stack[len(self.stack) - self.halfmove_clock:]:
+            count += entry[5] == self.key
+        return count >= 5
+
+    def is_game_over(self):
+        return self.halfmove_clock >= 150 or self.is_insufficient_material() or self.is_fivefold_repetition() \
+            or not self.has_legal_move()
+
+    def _toggle(self, code: int, square: int):
+        bb = BB_SQUARES[square]
+        color = code >> 3
+        self.pieces[color][code & 7] ^= bb
+        self.occupied_co[color] ^= bb
+
+    def make(self, move: int):
+        # plays a pseudo-legal move, returns False and leaves the position unchanged if it leaves the king in check
+        turn = self.turn
+        if move == 0:
+            # null move, only the side to move and the en passant square change
+            self.stack.append((0, 0, self.castling_rights, self.ep_square, self.halfmove_clock, self.key))
+            self.key ^= TURN_KEY ^ self.ep_key()
+            self.ep_square = None
+            self.halfmove_clock += 1
+            if turn == chess.BLACK:
+                self.fullmove_number += 1
+            self.turn = not turn
+            return True
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        promotion = move >> 12
+        mailbox = self.mailbox
+        own_pieces = self.pieces[turn]
+        occupied_co = self.occupied_co
+        code = mailbox[from_square]
+        piece_type = code & 7
+        pawn_move = piece_type == chess.PAWN
+        captured = mailbox[to_square]
+        own_keys = PIECE_KEYS[turn]
+        from_bb = BB_SQUARES[from_square]
+        to_bb = BB_SQUARES[to_square]
+        self.stack.append((move, captured, self.castling_rights, self.ep_square, self.halfmove_clock, self.key))
+        key = self.key ^ TURN_KEY ^ CASTLING_KEYS[self.castling_rights] ^ self.ep_key()
+
+        if captured:
+            self.pieces[not turn][captured & 7] ^= to_bb
+            occupied_co[not turn] ^= to_bb
+            key ^= PIECE_KEYS[not turn][captured & 7][to_square]
+        elif pawn_move and to_square == self.ep_square:
+            ep_capture = to_square - 8 if turn == chess.WHITE else to_square + 8
+            self._toggle(mailbox[ep_capture], ep_capture)
+            mailbox[ep_capture] = 0
+            key ^= PIECE_KEYS[not turn][chess.PAWN][ep_capture]
+        occupied_co[turn] ^= from_bb | to_bb
+        mailbox[from_square] = 0
+        if promotion:
+            own_pieces[piece_type] ^= from_bb
+            own_pieces[promotion] ^= to_bb
+            mailbox[to_square] = promotion | turn << 3
+            key ^= own_keys[piece_type][from_square] ^ own_keys[promotion][to_square]
+        else:
+            own_pieces[piece_type] ^= from_bb | to_bb
+            mailbox[to_square] = code
+            key ^= own_keys[piece_type][from_square] ^ own_keys[piece_type][to_square]
+
+        castling_rights = self.castling_rights
+        if castling_rights & (from_bb | to_bb):
+            castling_rights &= ~(from_bb | to_bb)
+        self.ep_square = None
+        if piece_type == chess.KING:
+            castling_rights &= ~(BB_RANK_1 if turn == chess.WHITE else BB_RANK_8)
+            if to_square - from_square in (2, -2):
+                rook_from, rook_to = CASTLING_ROOKS[to_square]
+                rook_bb = BB_SQUARES[rook_from] | BB_SQUARES[rook_to]
+                own_pieces[chess.ROOK] ^= rook_bb
+                occupied_co[turn] ^= rook_bb
+                mailbox[rook_to] = mailbox[rook_from]
+                mailbox[rook_from] = 0
+                key ^= own_keys[chess.ROOK][rook_from] ^ own_keys[chess.ROOK][rook_to]
+        elif pawn_move and to_square - from_square in (16, -16):
+            self.ep_square = (from_square + to_square) // 2
+        self.castling_rights = castling_rights
+        if pawn_move or captured:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if turn == chess.BLACK:
+            self.fullmove_number += 1
+        self.turn = not turn
+        self.key = key ^ CASTLING_KEYS[castling_rights] ^ self.ep_key()
+
+        king = own_pieces[chess.KING]
+        if king and self.is_attacked(king.bit_length() - 1, not turn):
+            self.unmake()
+            return False
+        return True
+
+    def unmake(self):
+        move, captured, self.castling_rights, ep_square, self.halfmove_clock, self.key = self.stack.pop()
+        self.ep_square = ep_square
+        turn = not self.turn
+        self.turn = turn
+        if turn == chess.BLACK:
+            self.fullmove_number -= 1
+        if move == 0:
+            return None
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        promotion = move >> 12
+        mailbox = self.mailbox
+        own_pieces = self.pieces[turn]
+        occupied_co = self.occupied_co
+        from_bb = BB_SQUARES[from_square]
+        to_bb = BB_SQUARES[to_square]
+        occupied_co[turn] ^= from_bb | to_bb
+        if promotion:
+            own_pieces[promotion] ^= to_bb
+            own_pieces[chess.PAWN] ^= from_bb
+            mailbox[from_square] = chess.PAWN | turn << 3
+            piece_type = chess.PAWN
+        else:
+            code = mailbox[to_square]
+            piece_type = code & 7
+            own_pieces[piece_type] ^= from_bb | to_bb
+            mailbox[from_square] = code
+        mailbox[to_square] = captured
+        if captured:
+            self.pieces[not turn][captured & 7] ^= to_bb
+            occupied_co[not turn] ^= to_bb
+        elif piece_type == chess.PAWN and to_square == ep_square:
+            ep_capture = to_square - 8 if turn == chess.WHITE else to_square + 8
+            pawn = chess.PAWN | (not turn) << 3
+            self._toggle(pawn, ep_capture)
+            mailbox[ep_capture] = pawn
+        elif piece_type == chess.KING and to_square - from_square in (2, -2):
+            rook_from, rook_to = CASTLING_ROOKS[to_square]
+            rook_bb = BB_SQUARES[rook_from] | BB_SQUARES[rook_to]
+            own_pieces[chess.ROOK] ^= rook_bb
+            occupied_co[turn] ^= rook_bb
+            mailbox[rook_from] = mailbox[rook_to]
+            mailbox[rook_to] = 0
+
+    def push(self, move: chess.Move):
+        if not self.make(encode_move(move) if move else 0):
+            raise ValueError(f'illegal move {move.uci()} in {self.fen()}')
+        self.move_stack.append(move)
+
+    def pop(self):
+        self.unmake()
+        return self.move_stack.pop()
+
+    def perft(self, depth: int, buffers: list = None):
+        if depth == 0:
+            return 1
+        if buffers is None:
+            buffers = [[0] * MOVE_BUFFER_SIZE for _ in range(depth + 1)]
+        buffer = buffers[depth]
+        nodes = 0
+        for i in range(self.generate_moves(buffer)):
+            if self.make(buffer[i]):
+                nodes += 1 if depth == 1 else self.perft(depth - 1, buffers)
+                self.unmake()
+        return nodes
+
+    def divide(self, depth: int):
+        buffers = [[0] * MOVE_BUFFER_SIZE for _ in range(depth + 1)]
+        return {decode_move(move).uci(): self._perft_after(move, depth, buffers) for move in self.legal_codes()}
+
+    def _perft_after(self, move: int, depth: int, buffers: list):
+        self.make(move)
+        nodes = self.perft(depth - 1, buffers)
+        self.unmake()
+        return nodes
+
+
+# standard perft positions with their node counts by depth, from depth 1
+PERFT_SUITE = [
+    (chess.STARTING_FEN, [20, 400, 8902, 197281, 4865609]),
+    ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', [48, 2039, 97862, 4085603]),
+    ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238, 674624]),
+    ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', [6, 264, 9467, 422333]),
+    ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379, 2103487]),
+    ('r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', [46, 2079, 89890, 3894594]),
+]
+
+
+def run_perft_suite(max_depth: int):
+    failures = 0
+    total_nodes = 0
+    total_time = 0.
+    for fen, expected_counts in PERFT_SUITE:
+        position = Position(fen)
+        for depth, expected in enumerate(expected_counts[:max_depth], start=1):
+            start_time = time.perf_counter()
+            nodes = position.perft(depth)
+            elapsed = time.perf_counter() - start_time
+            total_nodes += nodes
+            total_time += elapsed
+            status = 'ok' if nodes == expected else f'FAIL (expected {expected})'
+            failures += nodes != expected
+            print(f'{fen:<80} depth {depth}: {nodes:>9} {status}')
+    print(f'{total_nodes} nodes in {total_time:.2f} s, nps: {total_nodes / total_time:.0f}')
+    return failures == 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Count the leaf nodes of the move generator to a fixed depth')
+    parser.add_argument('--fen', help='position to search, the standard perft suite when omitted')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--divide', action='store_true', help='print the node count under every root move')
+    args = parser.parse_args()
+    if args.fen is None:
+        sys.exit(0 if run_perft_suite(args.depth) else 1)
+    position = Position(args.fen)
+    if args.divide:
+        for uci, nodes in position.divide(args.depth).items():
+            print(f'{uci}: {nodes}')
+    start_time = time.perf_counter()
+    nodes = position.perft(args.depth)
+    print(f'Nodes: {nodes}, nps: {nodes / (time.perf_counter() - start_time):.0f}')
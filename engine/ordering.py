@@ -0,0 +1,158 @@
+import chess
+from engine.evaluation import piece_values
+from engine.movegen import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, bishop_attacks, rook_attacks
+
+
+MAX_PLY = 128
+
+TT_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 28
+KILLER_SCORE = 1 << 27
+COUNTER_SCORE = 1 << 26
+HISTORY_MAX = 1 << 25
+
+# MVV_LVA[victim][attacker]: most valuable victim first, least valuable attacker as tie-break
+MVV_LVA = [[0] * 7 for _ in range(7)]
+for _victim in chess.PIECE_TYPES:
+    for _attacker in chess.PIECE_TYPES:
+        MVV_LVA[_victim][_attacker] = 64 * min(piece_values[_victim], piece_values[chess.QUEEN]) \
+            - _attacker
+PROMOTION_SCORE = 64 * piece_values[chess.QUEEN]
+SEE_VALUES = [0] + [piece_values[piece_type] for piece_type in chess.PIECE_TYPES]
+
+
+def attackers_to(board: chess.Board, square: int, occupied: int):
+    # attackers of both colors among the occupied squares, sliders see through the removed ones
+    diagonal = board.bishops | board.queens
+    straight = board.rooks | board.queens
+    return ((KNIGHT_ATTACKS[square] & board.knights)
+            | (KING_ATTACKS[square] & board.kings)
+            | (PAWN_ATTACKS[chess.BLACK][square] & board.pawns & board.occupied_co[chess.WHITE])
+            | (PAWN_ATTACKS[chess.WHITE][square] & board.pawns & board.occupied_co[chess.BLACK])
+            | (bishop_attacks(square, occupied) & diagonal)
+            | (rook_attacks(square, occupied) & straight)) & occupied
+
+
+def see(board: chess.Board, move: chess.Move):
+    # static exchange evaluation: material won by the side to move if both sides keep capturing on the
+    # target square with their least valuable attacker, pins are ignored
+    from_square = move.from_square
+    to_square = move.to_square
+    piece_type_at = board.piece_type_at
+    attacker = piece_type_at(from_square)
+    victim = piece_type_at(to_square)
+    occupied = board.occupied ^ chess.BB_SQUARES[from_square]
+    if victim is None and attacker == chess.PAWN and to_square == board.ep_square:
+        victim = chess.PAWN
+        occupied ^= chess.BB_SQUARES[to_square - 8 if board.turn == chess.WHITE else to_square + 8]
+    gain = [SEE_VALUES[victim] if victim is not None else 0]
+    if move.promotion is not None:
+        gain[0] += SEE_VALUES[move.promotion] - SEE_VALUES[chess.PAWN]
+        attacker = move.promotion
+    color = board.turn
+    while True:
+        # speculative gain if the piece now standing on the square is captured in turn
+        gain.append(SEE_VALUES[attacker] - gain[-1])
+        if max(-gain[-2], gain[-1]) < 0:
+            break
+        color = not color
+        own_attackers = attackers_to(board, to_square, occupied) & board.occupied_co[color]
+        if not own_attackers:
+            break
+        for attacker in chess.PIECE_TYPES:
+            candidates = own_attackers & board.pieces_mask(attacker, color)
+            if candidates:
+                break
+        occupied ^= candidates & -candidates
+    # the last gain is speculative: nobody captures the last piece
+    for i in range(len(gain) - 2, 0, -1):
+        gain[i - 1] = -max(-gain[i - 1], gain[i])
+    return gain[0]
+
+
+class MoveOrderer(object):
+    def __init__(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        # butterfly tables indexed by [from_square][to_square]
+        self.history = [[0] * 64 for _ in range(64)]
+        self.countermoves = [[None] * 64 for _ in range(64)]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_iteration(self):
+        for from_history in self.history:
+            for to_square in range(64):
+                from_history[to_square] //= 2
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.
+
+    def is_quiet(self, board: chess.Board, move: chess.Move):
+        return move.promotion is None and board.piece_type_at(move.to_square) is None \
+            and not (move.to_square == board.ep_square and board.piece_type_at(move.from_square) == chess.PAWN)
+
+    def order(self, board: chess.Board, moves: list, tt_move: chess.Move, ply: int):
+        killers = self.killers[ply]
+        history = self.history
+        counter = None
+        if board.move_stack:
+            last_move = board.move_stack[-1]
+            counter = self.countermoves[last_move.from_square][last_move.to_square]
+        piece_type_at = board.piece_type_at
+        ep_square = board.ep_square
+
+        def score(move):
+            if move == tt_move:
+                return TT_MOVE_SCORE
+            to_square = move.to_square
+            victim = piece_type_at(to_square)
+            if victim is not None:
+                return CAPTURE_SCORE + MVV_LVA[victim][piece_type_at(move.from_square)] \
+                    + (PROMOTION_SCORE if move.promotion else 0)
+            if move.promotion is not None:
+                return CAPTURE_SCORE + (PROMOTION_SCORE if move.promotion == chess.QUEEN else 0)
+            if to_square == ep_square and piece_type_at(move.from_square) == chess.PAWN:
+                return CAPTURE_SCORE + MVV_LVA[chess.PAWN][chess.PAWN]
+            if move == killers[0]:
+                return KILLER_SCORE + 1
+            if move == killers[1]:
+                return KILLER_SCORE
+            if move == counter:
+                return COUNTER_SCORE
+            return history[move.from_square][to_square]
+
+        return sorted(moves, key=score, reverse=True)
+
+    def order_captures(self, board: chess.Board, moves: list, tt_move: chess.Move):
+        # MVV-LVA order for the quiescence search
+        piece_type_at = board.piece_type_at
+
+        def score(move):
+            if move == tt_move:
+                return TT_MOVE_SCORE
+            victim = piece_type_at(move.to_square)
+            value = MVV_LVA[victim if victim is not None else chess.PAWN][piece_type_at(move.from_square)] \
+                if victim is not None or board.is_en_passant(move) else 0
+            if move.promotion is not None:
+                value += PROMOTION_SCORE if move.promotion == chess.QUEEN else 0
+            return value
+
+        return sorted(moves, key=score, reverse=True)
+
+    def update_cutoff(self, board: chess.Board, move: chess.Move, depth: int, ply: int, move_index: int):
+        # called on a beta cutoff, after the move has been popped from the board
+        self.cutoffs += 1
+        if move_index == 0:
+            self.first_move_cutoffs += 1
+        if not self.is_quiet(board, move):
+            return
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        from_history = self.history[move.from_square]
+        from_history[move.to_square] = min(from_history[move.to_square] + depth * depth, HISTORY_MAX)
+        if board.move_stack:
+            last_move = board.move_stack[-1]
+            self.countermoves[last_move.from_square][last_move.to_square] = move
@@ -1,27 +1,18 @@
 import chess
-import chess.engine
+# Engine lives in the headless engine.core, it is re-exported here for notebooks and older scripts
+from engine.core import Engine
 from engine.search import search, TranspTable
-from IPython.display import display, HTML, clear_output
+from engine.cache import AnalysisCache, DEFAULT_CACHE_MB
 from collections import namedtuple
 import time
 
 
-class Engine():
-    def __init__(self, time_limit, q_search_depth, transp_table_size):
-        super().__init__()
-        self.time_limit = time_limit
-        self.q_search_depth = q_search_depth
-        self.transp_table = TranspTable(transp_table_size)
-    
-    def play(self, board):
-        move, value, depth = search(board, board.turn, self.transp_table, self.q_search_depth, self.time_limit)
-        return move, value, depth
-
-
 Sf_conf = namedtuple('sf_config', ['sf', 'sf_elo', 'sf_tl', 'sf_skill', 'sf_num_cpus'])
 
 
 def configure_sf(sf_loc: str, sf_elo=None, sf_tl: float = 0.75, sf_skill: int = 20, sf_num_cpus: int = 1):
+    # chess.engine pulls in asyncio, only Stockfish games need it
+    import chess.engine
     sf = chess.engine.SimpleEngine.popen_uci(sf_loc)
     if sf_elo is None:
         sf.configure({'Threads': sf_num_cpus, 'Skill Level': sf_skill})
@@ -31,6 +22,8 @@ def configure_sf(sf_loc: str, sf_elo=None, sf_tl: float = 0.75, sf_skill: int =
 
 
 def display_board(board: chess.Board, winner=None):
+    # IPython is only needed inside a notebook, importing it takes longer than the whole engine
+    from IPython.display import display, HTML, clear_output
     turn = 'White' if board.turn else 'Black'
     html = f"<div><b>Move: {len(board.move_stack)}, Turn: {turn}"
     if winner is not None:
@@ -42,24 +35,50 @@ def display_board(board: chess.Board, winner=None):
     time.sleep(0.1)
 
 
+def open_transp_table(args: dict):
+    # the optional 'cache_path' and 'cache_mb' args share an AnalysisCache across games
+    transp_table = TranspTable(args['transp_tab_mb'])
+    cache = None
+    if args.get('cache_path'):
+        cache = AnalysisCache(args['cache_path'], args.get('cache_mb', DEFAULT_CACHE_MB))
+        cache.warm_start(transp_table)
+    return transp_table, cache
+
+
+def cached_search(board: chess.Board, max_player: bool, transp_table: TranspTable, cache, q_search_depth: int,
+                  time_limit: float):
+    search_info = search(board, max_player, transp_table, q_search_depth, time_limit)
+    if cache is not None:
+        cache.update(transp_table)
+    return search_info
+
+
+def close_cache(cache):
+    if cache is not None:
+        cache.close()
+
+
 def play_engine_vs_engine(engine_1_white: bool, search_args_1: dict, search_args_2: dict, time_limit: float,
                           visual: bool=False):
     board = chess.Board()
-    transp_table_1 = TranspTable(search_args_1['transp_tab_size'])
-    transp_table_2 = TranspTable(search_args_1['transp_tab_size'])
+    transp_table_1, cache_1 = open_transp_table(search_args_1)
+    transp_table_2, cache_2 = open_transp_table(search_args_2)
     if visual:
         display_board(board)
     while not board.is_game_over():
         if (engine_1_white and board.turn) or ((not engine_1_white) and (not board.turn)):
-            move, value, depth = search(board, engine_1_white, transp_table_1,
-                                 search_args_1['q_search_depth'], time_limit)
+            search_info = cached_search(board, engine_1_white, transp_table_1, cache_1,
+                                        search_args_1['q_search_depth'], time_limit)
         else:
-            move, value, depth = search(board, not engine_1_white, transp_table_2,
-                                 search_args_2['q_search_depth'], time_limit)
-        board.push(move)
+            search_info = cached_search(board, not engine_1_white, transp_table_2, cache_2,
+                                        search_args_2['q_search_depth'], time_limit)
+        board.push(search_info.best_move)
         if visual:
             display_board(board)
-            print(f'Depth: {depth}')
+            print(f'Depth: {search_info.depth}, Score: {search_info.score}, '
+                  f'Nodes: {search_info.nodes + search_info.qnodes}')
+    close_cache(cache_1)
+    close_cache(cache_2)
     if visual:
         winner = 'Draw'
         if board.outcome():
@@ -72,12 +91,16 @@ def play_engine_vs_engine(engine_1_white: bool, search_args_1: dict, search_args
             else:
                 winner = 'Draw'
         display_board(board, winner=winner)
+    else:
+        print(f'Result: {board.result()}')
+    return board.result()
 
 
 def play_sf_vs_engine(engine_white: bool, engine_args: dict, sf_args: dict, visual: bool=False):
+    import chess.engine
     sf = configure_sf(**sf_args)
     board = chess.Board()
-    transp_table = TranspTable(engine_args['transp_tab_size'])
+    transp_table, cache = open_transp_table(engine_args)
     if visual:
         display_board(board)
     while not board.is_game_over():
@@ -91,10 +114,11 @@ def play_sf_vs_engine(engine_white: bool, engine_args: dict, sf_args: dict, visu
                 sf_tl = sf.sf_tl
             move = sf.sf.play(board, limit=chess.engine.Limit(time=sf_tl)).move
         else:
-            move, value, depth = search(board, engine_white, transp_table,
-                                 engine_args['q_search_depth'], engine_args['time_limit'])
+            move = cached_search(board, engine_white, transp_table, cache, engine_args['q_search_depth'],
+                                 engine_args['time_limit']).best_move
         board.push(move)
         display_board(board)
+    close_cache(cache)
     if visual:
         winner = 'Draw'
         if board.outcome():
@@ -109,7 +133,7 @@ def play_sf_vs_engine(engine_white: bool, engine_args: dict, sf_args: dict, visu
 
 def play_human_vs_engine(human_white: bool, engine_args: dict):
     board = chess.Board()
-    transp_table = TranspTable(engine_args['transp_tab_size'])
+    transp_table, cache = open_transp_table(engine_args)
     display_board(board)
     _quit = False
     while not board.is_game_over():
@@ -128,12 +152,13 @@ def play_human_vs_engine(human_white: bool, engine_args: dict):
                 except:
                     print('Invalid move!')
         else:
-            move, value, depth = search(board, not human_white, transp_table,
-                                 engine_args['q_search_depth'], engine_args['time_limit'])
+            move = cached_search(board, not human_white, transp_table, cache, engine_args['q_search_depth'],
+                                 engine_args['time_limit']).best_move
         if _quit:
             break
         board.push(move)
         display_board(board)
+    close_cache(cache)
     winner = 'Draw'
     if board.outcome():
         winner = board.outcome().winner
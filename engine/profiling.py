@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+import chess
+import engine.search
+from engine.evaluation import Evaluator
+from engine.ordering import MoveOrderer
+from engine.search import Searcher
+from engine.transp_table import TranspTable
+
+
+SAMPLE_INTERVAL = 0.001
+
+# (owner, attribute, timer name, is a generator) of every function timed by FunctionTimers
+TIMED_FUNCTIONS = (
+    (Searcher, 'static_eval', 'static_eval', False),
+    (engine.search, 'see', 'see', False),
+    (Evaluator, 'evaluate', 'evaluate_incremental', False),
+    (chess.Board, 'generate_legal_moves', 'movegen', True),
+    (MoveOrderer, 'order', 'move_ordering', False),
+    (MoveOrderer, 'order_captures', 'capture_ordering', False),
+    (TranspTable, 'lookup', 'tt_probe', False),
+    (TranspTable, 'store', 'tt_store', False),
+    (Searcher, 'quiet_search', 'qsearch', False),
+)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def collapse_stack(frame):
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler(object):
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        # collapsed stack (root first, frames separated by ';') -> number of samples
+        self.stacks = Counter()
+        self.thread_id = None
+        self.sample_thread = None
+        self.previous_handler = None
+        self.running = False
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def start(self):
+        # samples the thread that calls start, which is the one running the search
+        self.thread_id = threading.get_ident()
+        self.running = True
+        if hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread():
+            self.previous_handler = signal.signal(signal.SIGPROF, self.on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            # signal handlers can only be installed from the main thread, so a searching worker thread
+            # is sampled from a helper thread instead
+            self.sample_thread = threading.Thread(target=self.sample_loop, daemon=True)
+            self.sample_thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.sample_thread is not None:
+            self.sample_thread.join()
+            self.sample_thread = None
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self.previous_handler)
+
+    def on_signal(self, signum, frame):
+        if self.running:
+            self.stacks[collapse_stack(frame)] += 1
+
+    def sample_loop(self):
+        while self.running:
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+    def write(self, path: str):
+        # collapsed-stack format read by flamegraph.pl, speedscope and inferno
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f'{stack} {count}\n')
+
+
+class FunctionTimers(object):
+    def __init__(self, timed_functions: tuple = TIMED_FUNCTIONS):
+        self.timed_functions = timed_functions
+        self.calls = Counter()
+        self.seconds = Counter()
+        self.active = Counter()
+        self.originals = []
+
+    def wrap(self, name: str, function, generator: bool):
+        calls = self.calls
+        seconds = self.seconds
+        active = self.active
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            calls[name] += 1
+            # recursive calls (qsearch) are counted but only the outermost one is timed
+            if active[name]:
+                return function(*args, **kwargs)
+            active[name] += 1
+            start_time = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds[name] += perf_counter() - start_time
+                active[name] -= 1
+
+        def timed_generator(*args, **kwargs):
+            # only the time spent producing moves is counted, not the time the caller spends on them
+            calls[name] += 1
+            moves = function(*args, **kwargs)
+            while True:
+                start_time = perf_counter()
+                try:
+                    move = next(moves)
+                except StopIteration:
+                    seconds[name] += perf_counter() - start_time
+                    return
+                seconds[name] += perf_counter() - start_time
+                yield move
+
+        return timed_generator if generator else timed
+
+    def install(self):
+        for owner, attribute, name, generator in self.timed_functions:
+            original = getattr(owner, attribute)
+            self.originals.append((owner, attribute, original))
+            setattr(owner, attribute, self.wrap(name, original, generator))
+
+    def uninstall(self):
+        for owner, attribute, original in reversed(self.originals):
+            setattr(owner, attribute, original)
+        self.originals = []
+
+    def report(self):
+        return {name: {'calls': self.calls[name], 'seconds': round(self.seconds[name], 6),
+                       'us_per_call': round(self.seconds[name] / self.calls[name] * 1e6, 3) if self.calls[name] else 0}
+                for _, _, name, _ in self.timed_functions}
+
+
+class Profiler(object):
+    def __init__(self, sample_interval: float = SAMPLE_INTERVAL, timers: bool = True):
+        self.sampler = StackSampler(sample_interval)
+        self.timers = FunctionTimers() if timers else None
+        self.elapsed = 0.
+
+    def __enter__(self):
+        if self.timers is not None:
+            self.timers.install()
+        self.start_time = time.perf_counter()
+        self.sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.sampler.stop()
+        self.elapsed = time.perf_counter() - self.start_time
+        if self.timers is not None:
+            self.timers.uninstall()
+
+    def save(self, path_prefix: str, **metadata):
+        # writes <path_prefix>.collapsed for flamegraph tools and <path_prefix>.json with the timers
+        self.sampler.write(path_prefix + '.collapsed')
+        report = dict(metadata)
+        report['elapsed'] = round(self.elapsed, 6)
+        report['samples'] = self.sampler.samples
+        report['sample_interval'] = self.sampler.interval
+        report['timers'] = self.timers.report() if self.timers is not None else {}
+        with open(path_prefix + '.json', 'w') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+
+if __name__ == '__main__':
+    from engine.bench import BENCH_FENS
+    from engine.core import Engine
+
+    parser = argparse.ArgumentParser(description='Profile the search on a set of positions, one profile per position')
+    parser.add_argument('--fen', action='append',
+                        help='position to profile, repeatable; the bench positions by default')
+    parser.add_argument('--out', default='profiles', help='directory receiving the .collapsed and .json files')
+    parser.add_argument('--time-limit', type=float, default=1.)
+    parser.add_argument('--q-search-depth', type=int, default=2)
+    parser.add_argument('--hash', type=float, default=16, help='transposition table size in MB')
+    parser.add_argument('--interval', type=float, default=SAMPLE_INTERVAL, help='sampling interval in seconds')
+    args = parser.parse_args()
+
+    chess_engine = Engine(args.time_limit, args.q_search_depth, args.hash, profile_dir=args.out,
+                          profile_interval=args.interval)
+    totals = Counter()
+    for fen in args.fen or BENCH_FENS:
+        chess_engine.transp_table.clear()
+        chess_engine.play(chess.Board(fen))
+        report = chess_engine.last_profile
+        for name, timer in report['timers'].items():
+            totals[name] += timer['seconds']
+        print(f'{report["path"]}: {report["samples"]} samples, depth {report["depth"]}, {fen}')
+    for name, seconds in totals.most_common():
+        print(f'{name:<22} {seconds:.3f} s')
@@ -1,233 +1,470 @@
 import chess
+from engine.evaluation import Evaluator, MATE_SCORE
+from engine.transp_table import TranspTable, EXACT, LOWERBOUND, UPPERBOUND
+from engine.eval_cache import EvalCache, PawnHashTable
+from engine.ordering import MoveOrderer, SEE_VALUES, MAX_PLY, see
+from engine.movegen import KNIGHT_ATTACKS, PAWN_ATTACKS, Position, bishop_attacks, rook_attacks
+from engine.timeman import TimeManager
+from engine import zobrist
 from chess.polyglot import zobrist_hash
-from engine.evaluation import evaluate_board, evaluate_move, is_endgame
-import numpy as np
-from collections import deque, namedtuple
-import time
-
-
-TranspTableRes = namedtuple('TranspTableRes', ('value', 'flag', 'depth', 'best_move'))
-
-
-class TranspTable(object):
-    def __init__(self, max_size: int):
-        self.entry = deque(maxlen=max_size)
-        self.value = deque(maxlen=max_size)
-        self.flag = deque(maxlen=max_size)
-        self.depth = deque(maxlen=max_size)
-        self.best_move = deque(maxlen=max_size)
-
-    def store(self, board: chess.Board, value: float, flag: str, depth: int, best_move: chess.Move):
-        z_hash = zobrist_hash(board)
-        if z_hash not in self.entry:
-            self.entry.append(z_hash)
-            self.value.append(value)
-            self.flag.append(flag)
-            self.depth.append(depth)
-            self.best_move.append(best_move)
-        else:
-            pos_index = self.entry.index(z_hash)
-            if depth > self.depth[pos_index]:
-                self.value[pos_index] = value
-                self.flag[pos_index] = flag
-                self.depth[pos_index] = depth
-                self.best_move[pos_index] = best_move
-
-    def lookup(self, board: chess.Board):
-        z_hash = zobrist_hash(board)
-        if z_hash in self.entry:
-            pos_index = self.entry.index(z_hash)
-            return TranspTableRes(self.value[pos_index], self.flag[pos_index], self.depth[pos_index], self.best_move[pos_index])
+from collections import namedtuple
+import math
+
+
+MAX_DEPTH = 64
+# scores beyond MATE_BOUND are mates, MATE_SCORE minus the distance in plies
+MATE_BOUND = MATE_SCORE - MAX_PLY
+INFINITE = MATE_SCORE + 1
+ASPIRATION_MIN_DEPTH = 4
+ASPIRATION_WINDOW = 50
+# a window wider than this is opened to the full range on that side
+ASPIRATION_MAX_WINDOW = 800
+# quiet checking moves are searched on the first quiescence ply
+Q_SEARCH_CHECKS = True
+# margin over the captured piece value for delta pruning in the quiescence search
+DELTA_MARGIN = 200
+NULL_MOVE_MIN_DEPTH = 2
+# a frontier node whose static evaluation plus this margin cannot reach alpha only searches tactical moves
+FUTILITY_MARGIN = 250
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3
+# LMR_REDUCTIONS[depth][move_index], larger for later moves at higher depths
+LMR_REDUCTIONS = [[int(0.75 + math.log(depth) * math.log(move_index) / 2.25) if depth and move_index else 0
+                   for move_index in range(64)] for depth in range(64)]
+
+# selective search features, each can be turned off to measure its effect
+SearchFeatures = namedtuple('SearchFeatures', ('null_move', 'late_move_reductions', 'futility_pruning'))
+DEFAULT_FEATURES = SearchFeatures(True, True, True)
+# search on the engine's own Position instead of a chess.Board, both visit the same nodes
+NATIVE_BOARD = False
+
+# score is the root score of the last completed iteration from the side to move's point of view,
+# iterations holds an IterationInfo for each of them
+SearchInfo = namedtuple('SearchInfo', ('best_move', 'score', 'depth', 'nodes', 'qnodes', 'tt_probes', 'tt_hits',
+                                       'tt_cutoffs', 'bitbase_hits', 'eval_cache_hit_rate', 'pawn_hash_hit_rate',
+                                       'beta_cutoffs', 'first_move_cutoff_rate', 'iterations', 'pv', 'time'))
+IterationInfo = namedtuple('IterationInfo', ('depth', 'score', 'nodes', 'time'))
+
+
+def search(board: chess.Board, max_player: bool, transp_table: TranspTable, q_search_depth: int, time_limit: float,
+           max_depth: int = MAX_DEPTH, stop_event=None, on_iteration=None, max_nodes: int = None, bitbases=None,
+           q_search_checks: bool = Q_SEARCH_CHECKS, features: SearchFeatures = DEFAULT_FEATURES,
+           native_board: bool = NATIVE_BOARD):
+    transp_table.new_search()
+    time_manager = TimeManager(time_limit, stop_event=stop_event, max_nodes=max_nodes)
+    searcher = Searcher(board, transp_table, q_search_depth, time_manager, bitbases, q_search_checks, features,
+                        native_board)
+    searcher.on_iteration = on_iteration
+    best_move, depth = searcher.iterative_deepening(max_player, max_depth)
+    return searcher.search_info(best_move, depth)
+
+
+def mate_moves(value: int):
+    # moves, not plies, to the mate of a mate score, negative when the side to move is getting mated, else None
+    if abs(value) < MATE_BOUND:
         return None
-
-
-def search(board: chess.Board, max_player: bool, transp_table: TranspTable, q_search_depth: int, time_limit: float):
-    start_time = time.time()
-    depth = 1
-    best_move = None
-    while True:
-        search_res = negamax(board.copy(stack=False), depth, max_player, root=True,
-                             transp_table=transp_table, q_search_depth=q_search_depth,
-                             start_time=start_time, time_limit=time_limit)
-        if search_res is not None:
+    moves = (MATE_SCORE - abs(value) + 1) // 2
+    return moves if value > 0 else -moves
+
+
+def value_to_tt(value: int, ply: int):
+    # mate scores are stored relative to the node, as the distance to mate from it
+    if value >= MATE_BOUND:
+        return value + ply
+    if value <= -MATE_BOUND:
+        return value - ply
+    return value
+
+
+def value_from_tt(value: int, ply: int):
+    if value >= MATE_BOUND:
+        return value - ply
+    if value <= -MATE_BOUND:
+        return value + ply
+    return value
+
+
+class Searcher(object):
+    def __init__(self, board: chess.Board, transp_table: TranspTable, q_search_depth: int,
+                 time_manager: TimeManager, bitbases=None, q_search_checks: bool = Q_SEARCH_CHECKS,
+                 features: SearchFeatures = DEFAULT_FEATURES, native_board: bool = NATIVE_BOARD):
+        # the only board copy of the whole search, every node works on it through push/pop
+        self.board = Position.from_board(board) if native_board else board.copy(stack=False)
+        self.key = zobrist_hash(board)
+        self.eval_cache = EvalCache()
+        self.pawn_table = PawnHashTable()
+        self.evaluator = Evaluator(self.board, self.pawn_table)
+        self.orderer = MoveOrderer()
+        self.transp_table = transp_table
+        self.q_search_depth = q_search_depth
+        self.q_search_checks = q_search_checks
+        self.features = features
+        self.time_manager = time_manager
+        self.nodes = 0
+        self.qnodes = 0
+        self.bitbases = bitbases
+        # root moves kept by the bitbases, None when the root position is not covered
+        self.root_moves = None
+        self.tt_cutoffs = 0
+        self.bitbase_hits = 0
+        self.null_move_cutoffs = 0
+        self.reductions = 0
+        self.re_searches = 0
+        self.futility_prunes = 0
+        self.aspiration_researches = 0
+        self.iterations = []
+        self.root_best_move = None
+        self.root_value = None
+        # called with the SearchInfo of every completed iteration
+        self.on_iteration = None
+
+    def iterative_deepening(self, max_player: bool, max_depth: int = MAX_DEPTH, start_depth: int = 1):
+        time_manager = self.time_manager
+        time_manager.start()
+        if not any(self.board.legal_moves):
+            # checkmate or stalemate, there is nothing to search
+            return None, 0
+        self.root_moves = self.bitbase_root_moves()
+        depth = start_depth
+        best_move = None
+        while depth <= max_depth:
+            if best_move is not None and not time_manager.can_start_iteration():
+                break
+            self.orderer.new_iteration()
+            self.root_best_move = None
+            time_manager.start_iteration(self.nodes + self.qnodes)
+            search_res = self.aspiration_search(depth, max_player)
+            if search_res is None:
+                # keep the best root move of the interrupted iteration if at least one move was completed
+                if self.root_best_move is not None:
+                    best_move = chess.Move.from_uci(self.root_best_move.uci())
+                break
+            time_manager.end_iteration(self.nodes + self.qnodes)
+            iteration_nodes, iteration_time = time_manager.iterations[-1]
+            self.iterations.append(IterationInfo(depth, self.root_value, iteration_nodes, iteration_time))
             best_move = chess.Move.from_uci(search_res.uci())
-        else:
-            break
-        depth += 1
-    value = evaluate_board(board)
-    if not max_player:
-        value *= -1
-    return best_move, value, depth - 1
-
-
-def negamax(board: chess.Board, depth, max_player: bool, root: bool,
-            transp_table: TranspTable, q_search_depth: int,
-            start_time: float, time_limit: float,
-            alpha: float=-float('Inf'), beta: float=float('Inf')):
-    alpha_orig = alpha
-
-    transp_tab_res = transp_table.lookup(board)
-    if (transp_tab_res is not None) and (transp_tab_res.depth >= depth):
-        if transp_tab_res.flag == 'EXACT':
-            return transp_tab_res.value if not root else transp_tab_res.best_move
-        elif transp_tab_res.flag == 'LOWERBOUND':
-            alpha = max(alpha, transp_tab_res.value)
-        elif transp_tab_res.flag == 'UPPERBOUND':
-            beta = min(beta, transp_tab_res.value)
-        if alpha >= beta:
-            return transp_tab_res.value if not root else transp_tab_res.best_move
-
-    if depth == 0 or board.is_game_over():
-        board_value = evaluate_board(board) if max_player else -evaluate_board(board)
-        if not board.is_game_over():
-            q_search_res = quiet_search(board.copy(stack=False), max_player, q_search_depth, alpha, beta, transp_table,
-                                        start_time, time_limit)
-            if q_search_res is not None:
-                if max_player and (q_search_res < board_value):
-                    return q_search_res
-                elif not max_player and (q_search_res > board_value):
-                    return q_search_res
-        return board_value
-
-    piece_map = board.piece_map()
-    end_game = is_endgame(board)
-    legal_moves = []
-    moves_score = []
-    not_sort_legal_moves = list(board.legal_moves)
-    if len(not_sort_legal_moves) > 1:
-        if transp_tab_res is not None:
-            not_sort_legal_moves.remove(transp_tab_res.best_move)
-        for move in not_sort_legal_moves:
-            legal_moves.append(move)
-            moves_score.append(evaluate_move(board, piece_map, end_game, move))
-        legal_moves = np.array(legal_moves)[np.array(moves_score).argsort()]
-        if max_player:
-            legal_moves = legal_moves[::-1]
-        if transp_tab_res is not None:
-            legal_moves = np.insert(legal_moves, 0, transp_tab_res.best_move)
-    else:
-        legal_moves = not_sort_legal_moves
-
-    value = -float('Inf')
-    best_move = -1
-    for i, move in enumerate(legal_moves):
-        board.push(move)
-        if time.time() - start_time > time_limit:
+            if self.on_iteration is not None:
+                self.on_iteration(self.search_info(best_move, depth))
+            depth += 1
+            if abs(self.root_value) >= MATE_BOUND and MATE_SCORE - abs(self.root_value) < depth:
+                # the mate was found with a full-width search, deeper iterations cannot improve it
+                break
+        return best_move, depth - 1
+
+    def aspiration_search(self, depth: int, max_player: bool):
+        # searches a window around the previous score, widening it on the failing side until the score fits
+        score = self.iterations[-1].score if self.iterations else None
+        if score is None or depth < ASPIRATION_MIN_DEPTH or abs(score) >= MATE_BOUND:
+            return self.negamax(self.key, depth, 0, max_player)
+        delta = ASPIRATION_WINDOW
+        alpha, beta = score - delta, score + delta
+        while True:
+            self.root_best_move = None
+            search_res = self.negamax(self.key, depth, 0, max_player, alpha, beta)
+            if search_res is None:
+                return None
+            if alpha < self.root_value < beta:
+                return search_res
+            self.aspiration_researches += 1
+            delta *= 2
+            if self.root_value <= alpha:
+                alpha = max(self.root_value - delta, -INFINITE) if delta < ASPIRATION_MAX_WINDOW else -INFINITE
+            else:
+                beta = min(self.root_value + delta, INFINITE) if delta < ASPIRATION_MAX_WINDOW else INFINITE
+
+    def search_info(self, best_move: chess.Move, depth: int):
+        transp_table = self.transp_table
+        tt_probes, tt_hits = transp_table.probes, transp_table.hits
+        pv = self.principal_variation(best_move, depth)
+        # the PV walk is not part of the search statistics
+        transp_table.probes, transp_table.hits = tt_probes, tt_hits
+        return SearchInfo(best_move, self.iterations[-1].score if self.iterations else None, depth, self.nodes,
+                          self.qnodes, tt_probes, tt_hits, self.tt_cutoffs, self.bitbase_hits,
+                          self.eval_cache.hit_rate, self.pawn_table.hit_rate, self.orderer.cutoffs,
+                          self.orderer.first_move_cutoff_rate, list(self.iterations), pv, self.time_manager.elapsed())
+
+    def bitbase_root_moves(self):
+        # the moves that keep the best bitbase result, the search then only picks among them
+        board = self.board
+        if self.bitbases is None or chess.popcount(board.occupied) != 3 or self.bitbases.probe(board) is None:
             return None
-        move_value = negamax(board.copy(stack=False), depth - 1, not max_player, False,
-                             transp_table, q_search_depth, start_time, time_limit,
-                             -beta, -alpha)
-        if move_value is None:
-            return None
-        move_value *= -1
-        board.pop()
-        if move_value > value:
-            value = move_value
-            best_move = i
-        alpha = max(alpha, value)
-        if alpha >= beta:
-            break
-
-    if value <= alpha_orig:
-        flag = 'UPPERBOUND'
-    elif value >= beta:
-        flag = 'LOWERBOUND'
-    else:
-        flag = 'EXACT'
-    transp_table.store(board, value, flag, depth, legal_moves[best_move])
-
-    if not root:
-        return value
-    return legal_moves[best_move]
-
-
-def quiet_search(board: chess.Board, max_player: bool, depth: int, alpha: float, beta: float, transp_table: TranspTable,
-                 start_time: float, time_limit: float):
-    value = evaluate_board(board) if max_player else -evaluate_board(board)
-    if value >= beta:
-        return beta
-    alpha = max(alpha, value)
-
-    if depth == 0 or board.is_game_over():
-        return value
-
-    piece_map = board.piece_map()
-    end_game = is_endgame(board)
-    danger_moves = []
-    moves_score = []
-    for move in board.legal_moves:
-        if board.is_capture(move) or board.gives_check(move):
-            danger_moves.append(move)
-            moves_score.append(evaluate_move(board, piece_map, end_game, move))
-    transp_tab_res = transp_table.lookup(board)
-    if (transp_tab_res is not None) and (len(danger_moves) > 1) and (transp_tab_res.best_move in danger_moves):
-        best_move_idx = danger_moves.index(transp_tab_res.best_move)
-        danger_moves.remove(transp_tab_res.best_move)
-        moves_score.remove(moves_score[best_move_idx])
-        danger_moves = np.array(danger_moves)[np.array(moves_score).argsort()]
-        if max_player:
-            danger_moves = danger_moves[::-1]
-        danger_moves = np.insert(danger_moves, 0, transp_tab_res.best_move)
-    else:
-        danger_moves = np.array(danger_moves)[np.array(moves_score).argsort()]
-        if max_player:
-            danger_moves = danger_moves[::-1]
-
-    for move in danger_moves:
-        board.push(move)
-        if time.time() - start_time > time_limit:
-            return None
-        value = quiet_search(board.copy(stack=False), not max_player, depth - 1, -beta, -alpha, transp_table,
-                             start_time, time_limit)
+        results = {}
+        for move in board.legal_moves:
+            board.push(move)
+            if board.is_checkmate():
+                results[move] = 1
+            elif board.is_game_over():
+                results[move] = 0
+            else:
+                result = self.bitbases.probe(board)
+                results[move] = -result if result is not None else 0
+            board.pop()
+        best_result = max(results.values(), default=0)
+        return {move for move, result in results.items() if result == best_result}
+
+    def static_eval(self, key: int):
+        # white-relative evaluation of the current board, which is not game over
+        value = self.eval_cache.lookup(key)
         if value is None:
-            return None
-        value *= -1
-        board.pop()
-        if value >= beta:
-            return beta
-        alpha = max(alpha, value)
-    return alpha
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+            value = self.evaluator.evaluate()
+            self.eval_cache.store(key, value)
+        return value
 
+    def principal_variation(self, best_move: chess.Move, max_length: int):
+        # follows the best moves stored in the transposition table from the root
+        board = self.board
+        key = self.key
+        pv = []
+        move = best_move
+        while move is not None and len(pv) < max(max_length, 1) and board.is_legal(move):
+            pv.append(move)
+            key = zobrist.push(board, move, key)
+            transp_tab_res = self.transp_table.lookup(key)
+            move = transp_tab_res.best_move if transp_tab_res is not None else None
+        for _ in pv:
+            board.pop()
+        return pv
+
+    def negamax(self, key: int, depth: int, ply: int, max_player: bool, alpha: int = -INFINITE,
+                beta: int = INFINITE):
+        board = self.board
+        root = ply == 0
+        transp_table = self.transp_table
+        evaluator = self.evaluator
+        self.nodes += 1
+        alpha_orig = alpha
+        if zobrist.DEBUG:
+            zobrist.verify(board, key)
+
+        transp_tab_res = transp_table.lookup(key)
+        if (transp_tab_res is not None) and (transp_tab_res.depth >= depth):
+            tt_value = value_from_tt(transp_tab_res.value, ply)
+            if root:
+                self.root_value = tt_value
+            if transp_tab_res.flag == EXACT:
+                self.tt_cutoffs += 1
+                return tt_value if not root else transp_tab_res.best_move
+            elif transp_tab_res.flag == LOWERBOUND:
+                alpha = max(alpha, tt_value)
+            elif transp_tab_res.flag == UPPERBOUND:
+                beta = min(beta, tt_value)
+            if alpha >= beta:
+                self.tt_cutoffs += 1
+                return tt_value if not root else transp_tab_res.best_move
+
+        game_over = board.is_game_over()
+        # inside a bitbase endgame the tree is still searched so the progress terms can lead to mate,
+        # the bitbase then only replaces the static evaluation
+        if self.bitbases is not None and not game_over and not root and (depth == 0 or self.root_moves is None) \
+                and chess.popcount(board.occupied) == 3:
+            bitbase_value = self.bitbases.probe_value(board)
+            if bitbase_value is not None:
+                self.bitbase_hits += 1
+                return bitbase_value if max_player else -bitbase_value
+        if game_over and not root:
+            return ply - MATE_SCORE if board.is_checkmate() else 0
+        if depth == 0:
+            return self.quiet_search(key, max_player, self.q_search_depth, alpha, beta, ply)
+
+        in_check = board.is_check()
+        # open-window nodes are PV nodes, the zero-window searches of PVS, LMR and null moves are not
+        pv_node = beta - alpha > 1
+        features = self.features
+        futile = False
+        if not root and not in_check and not pv_node:
+            static_value = self.static_eval(key)
+            if not max_player:
+                static_value = -static_value
+            # zugzwang is likely when the side to move only has pawns left, passing is then no lower bound
+            if features.null_move and depth >= NULL_MOVE_MIN_DEPTH and static_value >= beta and beta < MATE_BOUND \
+                    and board.move_stack and board.move_stack[-1] \
+                    and board.occupied_co[board.turn] & ~(board.pawns | board.kings):
+                null_key = zobrist.push_null(board, key)
+                null_value = self.negamax(null_key, max(depth - 1 - (2 + depth // 4), 0), ply + 1, not max_player,
+                                          -beta, -beta + 1)
+                board.pop()
+                if null_value is None:
+                    return None
+                if -null_value >= beta:
+                    self.null_move_cutoffs += 1
+                    return beta
+            futile = features.futility_pruning and depth == 1 and abs(alpha) < MATE_BOUND \
+                and static_value + FUTILITY_MARGIN <= alpha
+
+        tt_move = transp_tab_res.best_move if transp_tab_res is not None else None
+        legal_moves = list(board.legal_moves)
+        if root and self.root_moves is not None:
+            legal_moves = [move for move in legal_moves if move in self.root_moves]
+        legal_moves = self.orderer.order(board, legal_moves, tt_move, ply)
+
+        value = -INFINITE
+        best_move = -1
+        # upper bound of the futility-pruned moves, it only enters the returned bound, never the best move
+        futility_value = -INFINITE
+        for i, move in enumerate(legal_moves):
+            if self.time_manager.should_stop(self.nodes + self.qnodes):
+                return None
+            quiet = self.orderer.is_quiet(board, move)
+            if futile and i > 0 and quiet and not board.gives_check(move):
+                self.futility_prunes += 1
+                futility_value = max(futility_value, static_value + FUTILITY_MARGIN)
+                continue
+            evaluator.make(board, move)
+            child_key = zobrist.push(board, move, key)
+            if i == 0:
+                move_value = self.negamax(child_key, depth - 1, ply + 1, not max_player, -beta, -alpha)
+            else:
+                reduction = 0
+                if features.late_move_reductions and depth >= LMR_MIN_DEPTH and i >= LMR_MIN_MOVES and quiet \
+                        and not in_check and not board.is_check():
+                    reduction = min(LMR_REDUCTIONS[min(depth, 63)][min(i, 63)] - int(pv_node), depth - 2)
+                    if reduction > 0:
+                        self.reductions += 1
+                # PVS: later moves only have to prove they are not better than alpha, with a zero window
+                move_value = self.negamax(child_key, depth - 1 - max(reduction, 0), ply + 1, not max_player,
+                                          -alpha - 1, -alpha)
+                if move_value is not None and -move_value > alpha and reduction > 0:
+                    self.re_searches += 1
+                    move_value = self.negamax(child_key, depth - 1, ply + 1, not max_player, -alpha - 1, -alpha)
+                if move_value is not None and alpha < -move_value < beta:
+                    self.re_searches += 1
+                    move_value = self.negamax(child_key, depth - 1, ply + 1, not max_player, -beta, -alpha)
+            board.pop()
+            evaluator.unmake()
+            if move_value is None:
+                return None
+            move_value *= -1
+            if move_value > value:
+                value = move_value
+                best_move = i
+                if root:
+                    # a move failing low against an aspiration window is not a usable best move
+                    if value > alpha_orig:
+                        self.root_best_move = move
+                    self.root_value = value
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                self.orderer.update_cutoff(board, move, depth, ply, i)
+                break
+
+        # futility_value is at most alpha, so it can only raise a fail-low bound
+        value = max(value, futility_value)
+        if value <= alpha_orig:
+            flag = UPPERBOUND
+        elif value >= beta:
+            flag = LOWERBOUND
+        else:
+            flag = EXACT
+        transp_table.store(key, value_to_tt(value, ply), flag, depth,
+                           legal_moves[best_move] if best_move >= 0 else None)
+
+        if not root:
+            return value
+        return legal_moves[best_move]
+
+    def quiet_search(self, key: int, max_player: bool, depth: int, alpha: int, beta: int, ply: int):
+        board = self.board
+        evaluator = self.evaluator
+        self.qnodes += 1
+        if zobrist.DEBUG:
+            zobrist.verify(board, key)
+        if board.is_game_over():
+            return ply - MATE_SCORE if board.is_checkmate() else 0
+        if self.bitbases is not None and chess.popcount(board.occupied) == 3:
+            bitbase_value = self.bitbases.probe_value(board)
+            if bitbase_value is not None:
+                self.bitbase_hits += 1
+                return bitbase_value if max_player else -bitbase_value
+        stand_pat = self.static_eval(key)
+        if not max_player:
+            stand_pat = -stand_pat
+        in_check = board.is_check()
+        if depth == 0:
+            return stand_pat
+        if not in_check:
+            # standing pat is not an option when in check, every evasion is searched instead
+            if stand_pat >= beta:
+                return beta
+            alpha = max(alpha, stand_pat)
+
+        transp_tab_res = self.transp_table.lookup(key)
+        tt_move = transp_tab_res.best_move if transp_tab_res is not None else None
+        if in_check:
+            moves = self.orderer.order_captures(board, list(board.legal_moves), tt_move)
+        else:
+            moves = self.orderer.order_captures(board, self.quiet_search_moves(depth == self.q_search_depth),
+                                                tt_move)
+        piece_type_at = board.piece_type_at
+        for move in moves:
+            if not in_check:
+                victim = piece_type_at(move.to_square)
+                if victim is not None or board.is_en_passant(move):
+                    gain = SEE_VALUES[victim if victim is not None else chess.PAWN]
+                    if move.promotion is not None:
+                        gain += SEE_VALUES[move.promotion] - SEE_VALUES[chess.PAWN]
+                    # delta pruning: even winning the captured piece for free cannot raise alpha
+                    if stand_pat + gain + DELTA_MARGIN <= alpha:
+                        continue
+                    # losing captures are skipped, SEE is only needed when the attacker is worth more
+                    if SEE_VALUES[piece_type_at(move.from_square)] > gain and see(board, move) < 0:
+                        continue
+            if self.time_manager.should_stop(self.nodes + self.qnodes):
+                return None
+            evaluator.make(board, move)
+            child_key = zobrist.push(board, move, key)
+            value = self.quiet_search(child_key, not max_player, depth - 1, -beta, -alpha, ply + 1)
+            board.pop()
+            evaluator.unmake()
+            if value is None:
+                return None
+            value *= -1
+            if value >= beta:
+                return beta
+            alpha = max(alpha, value)
+        return alpha
+
+    def quiet_search_moves(self, checks: bool):
+        # captures and promotions, plus quiet checks when asked for on the first quiescence ply
+        board = self.board
+        moves = list(board.generate_legal_captures())
+        turn = board.turn
+        promotion_rank = chess.BB_RANK_7 if turn == chess.WHITE else chess.BB_RANK_2
+        pawns = board.pawns & board.occupied_co[turn] & promotion_rank
+        if pawns:
+            moves.extend(board.generate_legal_moves(pawns, chess.BB_BACKRANKS & ~board.occupied))
+        if checks and self.q_search_checks:
+            moves.extend(self.quiet_checks(chess.BB_ALL & ~(board.pawns & promotion_rank)))
+        return moves
+
+    def quiet_checks(self, from_mask: int):
+        # direct checks land on the squares attacking the enemy king, only the moves of pieces shielding
+        # one of our sliders from it need the slower gives_check test
+        board = self.board
+        turn = board.turn
+        king = board.king(not turn)
+        if king is None:
+            return []
+        occupied = board.occupied
+        ours = board.occupied_co[turn] & from_mask
+        empty = chess.BB_ALL & ~occupied
+        diagonal = bishop_attacks(king, occupied)
+        straight = rook_attacks(king, occupied)
+        check_squares = {chess.PAWN: PAWN_ATTACKS[not turn][king], chess.KNIGHT: KNIGHT_ATTACKS[king],
+                         chess.BISHOP: diagonal, chess.ROOK: straight, chess.QUEEN: diagonal | straight}
+        moves = []
+        for piece_type, squares in check_squares.items():
+            if squares & empty:
+                moves.extend(board.generate_legal_moves(board.pieces_mask(piece_type, turn) & ours, squares & empty))
+        sliders = (bishop_attacks(king, 0) & (board.bishops | board.queens)
+                   | rook_attacks(king, 0) & (board.rooks | board.queens)) & board.occupied_co[turn]
+        shields = 0
+        for slider in chess.scan_forward(sliders):
+            between = chess.between(slider, king) & occupied
+            if chess.popcount(between) == 1:
+                shields |= between & ours
+        if shields:
+            for move in board.generate_legal_moves(shields, empty):
+                if not check_squares.get(board.piece_type_at(move.from_square), 0) & chess.BB_SQUARES[move.to_square] \
+                        and board.gives_check(move):
+                    moves.append(move)
+        return moves
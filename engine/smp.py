@@ -0,0 +1,91 @@
+import sys
+import traceback
+import chess
+import multiprocessing as mp
+from engine.search import Searcher, MAX_DEPTH, Q_SEARCH_CHECKS, DEFAULT_FEATURES
+from engine.transp_table import TranspTable
+from engine.timeman import TimeManager
+from engine.bitbase import Bitbases
+
+
+def helper_loop(worker_id: int, transp_table_mb: float, shm_name: str, tasks, done, stop_event,
+                bitbase_dir: str = None):
+    transp_table = TranspTable(transp_table_mb, shm_name=shm_name)
+    bitbases = Bitbases.load(bitbase_dir) if bitbase_dir else None
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            try:
+                fen, max_player, q_search_depth, q_search_checks, features, time_limit, generation = task
+                transp_table.generation = generation
+                time_manager = TimeManager(time_limit, soft_ratio=1., stop_event=stop_event)
+                searcher = Searcher(chess.Board(fen), transp_table, q_search_depth, time_manager, bitbases,
+                                    q_search_checks, features)
+                # odd helpers start one ply deeper so the workers spread over different iterations
+                searcher.iterative_deepening(max_player, MAX_DEPTH, start_depth=1 + worker_id % 2)
+            except Exception:
+                # a failed helper only loses its share of the search, the main worker still returns a move
+                print(f'helper {worker_id} failed:', file=sys.stderr)
+                traceback.print_exc()
+            finally:
+                # LazySMP.search waits for every helper before returning
+                done.put(worker_id)
+    finally:
+        transp_table.close()
+        if bitbases is not None:
+            bitbases.close()
+
+
+class LazySMP(object):
+    def __init__(self, workers: int, transp_table_mb: float, bitbase_dir: str = None):
+        self.transp_table = TranspTable.shared(transp_table_mb)
+        self.stop_event = mp.Event()
+        self.done = mp.Queue()
+        self.tasks = []
+        self.helpers = []
+        # the calling process is worker 0, the other workers are helper processes
+        for worker_id in range(1, workers):
+            tasks = mp.Queue()
+            helper = mp.Process(target=helper_loop, daemon=True,
+                                args=(worker_id, transp_table_mb, self.transp_table.shm_name, tasks, self.done,
+                                      self.stop_event, bitbase_dir))
+            helper.start()
+            self.tasks.append(tasks)
+            self.helpers.append(helper)
+
+    @property
+    def workers(self):
+        return len(self.helpers) + 1
+
+    def search(self, board: chess.Board, max_player: bool, q_search_depth: int, time_limit: float,
+               max_depth: int = MAX_DEPTH, stop_event=None, on_iteration=None, max_nodes: int = None,
+               bitbases=None, q_search_checks: bool = Q_SEARCH_CHECKS, features=DEFAULT_FEATURES):
+        self.transp_table.new_search()
+        self.stop_event.clear()
+        task = (board.fen(), max_player, q_search_depth, q_search_checks, features, time_limit,
+                self.transp_table.generation)
+        for tasks in self.tasks:
+            tasks.put(task)
+        time_manager = TimeManager(time_limit, stop_event=stop_event, max_nodes=max_nodes)
+        searcher = Searcher(board, self.transp_table, q_search_depth, time_manager, bitbases, q_search_checks,
+                            features)
+        searcher.on_iteration = on_iteration
+        try:
+            best_move, depth = searcher.iterative_deepening(max_player, max_depth)
+        finally:
+            # helpers must be idle before the next search bumps the generation
+            self.stop_event.set()
+            for _ in self.helpers:
+                self.done.get()
+        return searcher.search_info(best_move, depth)
+
+    def close(self):
+        for tasks in self.tasks:
+            tasks.put(None)
+        for helper in self.helpers:
+            helper.join()
+        self.tasks = []
+        self.helpers = []
+        self.transp_table.close()
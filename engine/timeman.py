@@ -0,0 +1,73 @@
+import time
+
+
+# past this fraction of the time limit only iterations predicted to finish are started
+SOFT_RATIO = 0.5
+# the clock is read once every POLL_INTERVAL node checks
+POLL_INTERVAL = 256
+DEFAULT_EBF = 4.
+
+
+class TimeManager(object):
+    def __init__(self, time_limit: float, soft_ratio: float = SOFT_RATIO, poll_interval: int = POLL_INTERVAL,
+                 stop_event=None, max_nodes: int = None):
+        self.hard_limit = time_limit
+        self.soft_limit = time_limit * soft_ratio
+        self.poll_interval = poll_interval
+        self.stop_event = stop_event
+        self.max_nodes = max_nodes
+        self.start()
+
+    def start(self):
+        self.start_time = time.time()
+        self.poll_countdown = self.poll_interval
+        self.stopped = False
+        # (nodes, seconds) of every completed iteration
+        self.iterations = []
+        self.iteration_start = (0, self.start_time)
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def should_stop(self, nodes: int):
+        if self.stopped:
+            return True
+        if self.max_nodes is not None and nodes >= self.max_nodes:
+            self.stopped = True
+            return True
+        self.poll_countdown -= 1
+        if self.poll_countdown > 0:
+            return False
+        self.poll_countdown = self.poll_interval
+        if time.time() - self.start_time > self.hard_limit:
+            self.stopped = True
+        elif self.stop_event is not None and self.stop_event.is_set():
+            self.stopped = True
+        return self.stopped
+
+    def start_iteration(self, nodes: int):
+        self.iteration_start = (nodes, time.time())
+
+    def end_iteration(self, nodes: int):
+        start_nodes, start_time = self.iteration_start
+        self.iterations.append((nodes - start_nodes, time.time() - start_time))
+
+    def ebf(self):
+        if len(self.iterations) < 2 or self.iterations[-2][0] == 0:
+            return DEFAULT_EBF
+        return self.iterations[-1][0] / self.iterations[-2][0]
+
+    def predicted_iteration_time(self):
+        if not self.iterations:
+            return 0.
+        return self.iterations[-1][1] * self.ebf()
+
+    def can_start_iteration(self):
+        if self.stopped:
+            return False
+        elapsed = self.elapsed()
+        if elapsed > self.hard_limit:
+            return False
+        if elapsed < self.soft_limit:
+            return True
+        return elapsed + self.predicted_iteration_time() <= self.hard_limit
@@ -0,0 +1,218 @@
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import time
+import chess
+import chess.pgn
+from engine.core import Engine
+from engine.search import SearchFeatures, DEFAULT_FEATURES
+
+
+DEFAULT_OPENINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'openings.epd')
+DEFAULT_ENGINE_ARGS = {'transp_tab_mb': 16, 'q_search_depth': 2, 'time_limit': 0.1}
+# games still running after this many plies are adjudicated as draws
+MAX_PLIES = 400
+
+
+def load_openings(path: str):
+    openings = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            board, operations = chess.Board.from_epd(line)
+            openings.append((board.fen(), operations.get('id', board.epd())))
+    return openings
+
+
+def parse_engine_args(text: str):
+    engine_args = dict(DEFAULT_ENGINE_ARGS)
+    for item in filter(None, text.split(',')):
+        name, value = item.split('=')
+        engine_args[name.strip()] = float(value) if '.' in value else int(value)
+    return engine_args
+
+
+def play_game(task: tuple):
+    game_id, fen, opening_name, engine_1_white, engine_args_1, engine_args_2 = task
+    engines = []
+    board = chess.Board(fen)
+    try:
+        for engine_args in (engine_args_1, engine_args_2):
+            # null_move=0, late_move_reductions=0 or futility_pruning=0 turns the feature off
+            features = SearchFeatures(*(bool(engine_args.get(name, enabled)) for name, enabled
+                                        in DEFAULT_FEATURES._asdict().items()))
+            engines.append(Engine(engine_args['time_limit'], engine_args['q_search_depth'],
+                                  engine_args['transp_tab_mb'], features=features))
+        white, black = engines if engine_1_white else engines[::-1]
+        while not board.is_game_over(claim_draw=True) and len(board.move_stack) < MAX_PLIES:
+            engine = white if board.turn == chess.WHITE else black
+            move = engine.play(board).best_move
+            if move is None:
+                # the first iteration was cut off, play a legal move like the UCI front end does
+                move = next(iter(board.legal_moves))
+            board.push(move)
+    finally:
+        for engine in engines:
+            engine.close()
+    result = board.result(claim_draw=True)
+    if result == '*':
+        result = '1/2-1/2'
+
+    game = chess.pgn.Game.from_board(board)
+    game.headers['Event'] = 'Chassy tournament'
+    game.headers['Round'] = str(game_id + 1)
+    game.headers['White'] = 'engine_1' if engine_1_white else 'engine_2'
+    game.headers['Black'] = 'engine_2' if engine_1_white else 'engine_1'
+    game.headers['Opening'] = opening_name
+    game.headers['Result'] = result
+    if result == '1/2-1/2' and not board.is_game_over(claim_draw=True):
+        game.headers['Termination'] = 'adjudication'
+    if result == '1-0':
+        engine_1_score = 1. if engine_1_white else 0.
+    elif result == '0-1':
+        engine_1_score = 0. if engine_1_white else 1.
+    else:
+        engine_1_score = 0.5
+    return game_id, engine_1_score, str(game)
+
+
+def score_to_elo(score: float):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def elo_stats(wins: int, draws: int, losses: int):
+    games = wins + draws + losses
+    if games == 0:
+        return 0., 0., 0.5
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.959964 * math.sqrt(variance / games)
+    elo = score_to_elo(score)
+    error = (score_to_elo(score + margin) - score_to_elo(score - margin)) / 2
+    los = 0.5 * (1 + math.erf((wins - losses) / math.sqrt(2 * (wins + losses)))) if wins + losses else 0.5
+    return elo, error, los
+
+
+def sprt_llr(wins: int, draws: int, losses: int, elo0: float, elo1: float):
+    # log-likelihood ratio of H1 (elo1) against H0 (elo0) with the normal approximation of the trinomial model
+    games = wins + draws + losses
+    if games == 0 or wins + losses == 0:
+        return 0.
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0:
+        return 0.
+    score_0 = 1 / (1 + 10 ** (-elo0 / 400))
+    score_1 = 1 / (1 + 10 ** (-elo1 / 400))
+    return games * (score_1 - score_0) * (2 * score - score_0 - score_1) / (2 * variance)
+
+
+def sprt_bounds(alpha: float, beta: float):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+class Tournament(object):
+    def __init__(self, openings: list, engine_args_1: dict, engine_args_2: dict, rounds: int = 1,
+                 elo0: float = 0., elo1: float = 5., alpha: float = 0.05, beta: float = 0.05):
+        self.openings = openings
+        self.engine_args_1 = engine_args_1
+        self.engine_args_2 = engine_args_2
+        self.rounds = rounds
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.alpha = alpha
+        self.beta = beta
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    def tasks(self):
+        # every opening is played twice with colours swapped
+        game_id = 0
+        for _ in range(self.rounds):
+            for fen, name in self.openings:
+                for engine_1_white in (True, False):
+                    yield game_id, fen, name, engine_1_white, self.engine_args_1, self.engine_args_2
+                    game_id += 1
+
+    def add_result(self, engine_1_score: float):
+        if engine_1_score == 1.:
+            self.wins += 1
+        elif engine_1_score == 0.:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def sprt_status(self):
+        lower, upper = sprt_bounds(self.alpha, self.beta)
+        llr = sprt_llr(self.wins, self.draws, self.losses, self.elo0, self.elo1)
+        if llr >= upper:
+            return llr, 'accept H1'
+        if llr <= lower:
+            return llr, 'accept H0'
+        return llr, 'continue'
+
+    def summary(self):
+        elo, error, los = elo_stats(self.wins, self.draws, self.losses)
+        llr, status = self.sprt_status()
+        lower, upper = sprt_bounds(self.alpha, self.beta)
+        return {
+            'engine_1': self.engine_args_1,
+            'engine_2': self.engine_args_2,
+            'games': self.wins + self.draws + self.losses,
+            'wins': self.wins,
+            'draws': self.draws,
+            'losses': self.losses,
+            'elo': round(elo, 2),
+            'elo_error_95': round(error, 2),
+            'los': round(los, 4),
+            'sprt': {'elo0': self.elo0, 'elo1': self.elo1, 'alpha': self.alpha, 'beta': self.beta,
+                     'llr': round(llr, 3), 'lower_bound': round(lower, 3), 'upper_bound': round(upper, 3),
+                     'status': status},
+        }
+
+    def run(self, workers: int, pgn_path: str, stop_on_sprt: bool = True):
+        start_time = time.time()
+        with mp.Pool(workers) as pool, open(pgn_path, 'w') as pgn_file:
+            for game_id, engine_1_score, pgn in pool.imap_unordered(play_game, self.tasks()):
+                self.add_result(engine_1_score)
+                pgn_file.write(pgn + '\n\n')
+                pgn_file.flush()
+                elo, error, _ = elo_stats(self.wins, self.draws, self.losses)
+                llr, status = self.sprt_status()
+                print(f'Game {game_id + 1}: +{self.wins} ={self.draws} -{self.losses} '
+                      f'Elo {elo:+.1f} +/- {error:.1f} LLR {llr:.2f} ({status}) '
+                      f'{time.time() - start_time:.0f} s', flush=True)
+                if stop_on_sprt and status != 'continue':
+                    pool.terminate()
+                    break
+        return self.summary()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play engine_1 against engine_2 over an opening suite')
+    parser.add_argument('--openings', default=DEFAULT_OPENINGS, help='EPD file, one opening per line')
+    parser.add_argument('--engine1', default='', help='comma separated overrides, e.g. q_search_depth=3,time_limit=0.2')
+    parser.add_argument('--engine2', default='')
+    parser.add_argument('--rounds', type=int, default=1, help='times the whole suite is played')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--pgn', default='tournament.pgn')
+    parser.add_argument('--summary', default='tournament.json')
+    parser.add_argument('--elo0', type=float, default=0.)
+    parser.add_argument('--elo1', type=float, default=5.)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--no-sprt-stop', action='store_true', help='play all games even after SPRT concludes')
+    args = parser.parse_args()
+
+    tournament = Tournament(load_openings(args.openings), parse_engine_args(args.engine1),
+                            parse_engine_args(args.engine2), args.rounds, args.elo0, args.elo1, args.alpha, args.beta)
+    summary = tournament.run(args.workers, args.pgn, stop_on_sprt=not args.no_sprt_stop)
+    with open(args.summary, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,177 @@
+import chess
+import numpy as np
+from collections import namedtuple
+
+
+TranspTableRes = namedtuple('TranspTableRes', ('value', 'flag', 'depth', 'best_move'))
+
+EXACT = 1
+LOWERBOUND = 2
+UPPERBOUND = 3
+
+BUCKET_SIZE = 2
+GEN_CYCLE = 64
+
+# 16 bytes per entry: the bound lives in the low 2 bits of `gen_bound` and the search generation
+# in the upper 6 bits. The last 8 bytes form a single data word and `key` holds zobrist ^ data,
+# so an entry torn by a concurrent writer fails the key check instead of returning mixed fields.
+TT_ENTRY = np.dtype([('key', '<u8'), ('score', '<i4'), ('move', '<u2'), ('depth', 'i1'), ('gen_bound', 'u1')])
+
+
+def encode_move(move: chess.Move):
+    if move is None:
+        return 0
+    promotion = move.promotion if move.promotion is not None else 0
+    return move.from_square | (move.to_square << 6) | (promotion << 12)
+
+
+def decode_move(code: int):
+    if code == 0:
+        return None
+    promotion = code >> 12
+    return chess.Move(code & 63, (code >> 6) & 63, promotion if promotion else None)
+
+
+def pack_data(score: int, move: int, depth: int, gen_bound: int):
+    return (score & 0xFFFFFFFF) | (move << 32) | ((depth & 0xFF) << 48) | (gen_bound << 56)
+
+
+def unpack_data(data: int):
+    score = data & 0xFFFFFFFF
+    if score >= 2 ** 31:
+        score -= 2 ** 32
+    depth = (data >> 48) & 0xFF
+    if depth >= 128:
+        depth -= 256
+    return score, (data >> 32) & 0xFFFF, depth, data >> 56
+
+
+def num_buckets_for(size_mb: float, bucket_bytes: int = BUCKET_SIZE * TT_ENTRY.itemsize):
+    # the largest power of two number of buckets fitting in size_mb
+    num_buckets = 1
+    max_buckets = int(size_mb * 2 ** 20) // bucket_bytes
+    while num_buckets * 2 <= max_buckets:
+        num_buckets *= 2
+    return num_buckets
+
+
+class TranspTable(object):
+    def __init__(self, size_mb: float, shm_name: str = None):
+        num_buckets = num_buckets_for(size_mb)
+        self.mask = num_buckets - 1
+        self.shm = None
+        if shm_name is None:
+            self.table = np.zeros(num_buckets * BUCKET_SIZE, dtype=TT_ENTRY)
+        else:
+            # attach to a table created by TranspTable.shared in another process
+            from multiprocessing import shared_memory
+            self.shm = shared_memory.SharedMemory(name=shm_name)
+            self.table = np.ndarray(num_buckets * BUCKET_SIZE, dtype=TT_ENTRY, buffer=self.shm.buf)
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        # (key ^ data, data) word pairs, the only view touched by store/lookup
+        self._words = self.table.view('<u8').reshape(-1, 2)
+
+    @classmethod
+    def shared(cls, size_mb: float):
+        # shared_memory needs Python 3.8, it is only imported by Lazy SMP so single-threaded search runs on 3.7
+        from multiprocessing import shared_memory
+        num_bytes = num_buckets_for(size_mb) * BUCKET_SIZE * TT_ENTRY.itemsize
+        shm = shared_memory.SharedMemory(create=True, size=num_bytes)
+        shm.buf[:] = bytes(num_bytes)
+        transp_table = cls(size_mb, shm_name=shm.name)
+        transp_table.owner_shm = shm
+        return transp_table
+
+    @property
+    def shm_name(self):
+        return self.shm.name if self.shm is not None else None
+
+    @property
+    def size_mb(self):
+        return self.table.nbytes / 2 ** 20
+
+    def close(self):
+        if self.shm is not None:
+            self._words = None
+            self.table = None
+            self.shm.close()
+            self.shm = None
+            owner_shm = getattr(self, 'owner_shm', None)
+            if owner_shm is not None:
+                owner_shm.close()
+                owner_shm.unlink()
+                self.owner_shm = None
+
+    def clear(self):
+        self.table.fill(0)
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        self.generation = (self.generation + 1) % GEN_CYCLE
+        self.probes = 0
+        self.hits = 0
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.
+
+    def store(self, z_hash: int, value: int, flag: int, depth: int, best_move: chess.Move):
+        words = self._words
+        idx = (z_hash & self.mask) * BUCKET_SIZE
+        # slot 0 keeps the deepest entry of the current search, slot 1 is always replaced
+        stored_data = int(words[idx, 1])
+        _, stored_move, stored_depth, stored_gen_bound = unpack_data(stored_data)
+        stale = (stored_gen_bound >> 2) != self.generation
+        move = encode_move(best_move)
+        # a shallower result never replaces the deep entry, not even one for the same key, while a result of the same
+        # depth does, so the exact score of a PVS or aspiration re-search overwrites the bound stored by the
+        # zero-window search before it
+        if depth < stored_depth and not stale:
+            idx += 1
+        elif int(words[idx, 0]) ^ stored_data == z_hash and not move:
+            # the entry is replaced, a result without a move keeps the stored one
+            move = stored_move
+        data = pack_data(value, move, depth, (self.generation << 2) | flag)
+        words[idx, 1] = data
+        words[idx, 0] = z_hash ^ data
+
+    def load(self, keys: np.ndarray, scores: np.ndarray, moves: np.ndarray, depths: np.ndarray, flags: np.ndarray):
+        # bulk store into the depth-preferred slots, when keys share a bucket the last one wins
+        data = ((scores.astype(np.int64) & 0xFFFFFFFF).astype(np.uint64)
+                | (moves.astype(np.uint64) << np.uint64(32))
+                | ((depths.astype(np.int64) & 0xFF).astype(np.uint64) << np.uint64(48))
+                | ((flags.astype(np.uint64) | np.uint64(self.generation << 2)) << np.uint64(56)))
+        idx = (keys.astype(np.uint64) & np.uint64(self.mask)).astype(np.int64) * BUCKET_SIZE
+        self._words[idx, 1] = data
+        self._words[idx, 0] = keys.astype(np.uint64) ^ data
+
+    def export(self, min_depth: int = 0):
+        # keys, scores, moves, depths and flags of the entries stored by the current search at least min_depth deep
+        words = self._words
+        data = words[:, 1]
+        gen_bounds = (data >> np.uint64(56)).astype(np.uint8)
+        depths = ((data >> np.uint64(48)) & np.uint64(0xFF)).astype(np.uint8).view(np.int8)
+        selected = np.flatnonzero(((gen_bounds & 3) != 0) & ((gen_bounds >> 2) == self.generation)
+                                  & (depths >= min_depth))
+        data = data[selected]
+        keys = words[selected, 0] ^ data
+        scores = (data & np.uint64(0xFFFFFFFF)).astype(np.uint32).view(np.int32)
+        moves = ((data >> np.uint64(32)) & np.uint64(0xFFFF)).astype(np.uint16)
+        return keys, scores, moves, depths[selected], gen_bounds[selected] & 3
+
+    def lookup(self, z_hash: int):
+        words = self._words
+        idx = (z_hash & self.mask) * BUCKET_SIZE
+        self.probes += 1
+        for i in range(idx, idx + BUCKET_SIZE):
+            data = int(words[i, 1])
+            if int(words[i, 0]) ^ data == z_hash:
+                score, move, depth, gen_bound = unpack_data(data)
+                if gen_bound & 3:
+                    self.hits += 1
+                    return TranspTableRes(score, gen_bound & 3, depth, decode_move(move))
+        return None
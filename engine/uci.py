@@ -0,0 +1,234 @@
+import sys
+import threading
+import chess
+from engine.core import Engine
+from engine.search import MAX_DEPTH, mate_moves
+
+
+ENGINE_NAME = 'Chassy'
+ENGINE_AUTHOR = 'cesch97'
+
+DEFAULT_HASH_MB = 64
+MAX_HASH_MB = 4096
+DEFAULT_THREADS = 1
+MAX_THREADS = 64
+DEFAULT_Q_SEARCH_DEPTH = 2
+# margin kept on the clock for communication delays, in seconds
+MOVE_OVERHEAD = 0.05
+DEFAULT_MOVES_TO_GO = 30
+
+
+def parse_go(tokens: list, on_error=None):
+    # a limit with an invalid value is skipped and reported through on_error
+    limits = {}
+    int_params = ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'movetime', 'depth', 'nodes')
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in int_params and i + 1 < len(tokens):
+            try:
+                limits[token] = int(tokens[i + 1])
+            except ValueError:
+                if on_error is not None:
+                    on_error(f'info string invalid value {tokens[i + 1]} for {token}')
+            i += 2
+        else:
+            if token == 'infinite':
+                limits['infinite'] = True
+            i += 1
+    return limits
+
+
+def allocate_time(limits: dict, turn: bool):
+    if 'movetime' in limits:
+        return max(limits['movetime'] / 1000 - MOVE_OVERHEAD, 0.01)
+    time_left = limits.get('wtime' if turn == chess.WHITE else 'btime')
+    if limits.get('infinite') or time_left is None:
+        return float('Inf')
+    increment = limits.get('winc' if turn == chess.WHITE else 'binc', 0)
+    moves_to_go = limits.get('movestogo', DEFAULT_MOVES_TO_GO)
+    time_left /= 1000
+    time_limit = time_left / max(moves_to_go, 1) + increment / 1000 * 0.75
+    return max(min(time_limit, time_left / 2 - MOVE_OVERHEAD), 0.01)
+
+
+def format_score(value):
+    moves = mate_moves(value)
+    if moves is not None:
+        return f'mate {moves}'
+    return f'cp {int(value)}'
+
+
+class UCI(object):
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.board = chess.Board()
+        self.hash_mb = DEFAULT_HASH_MB
+        self.threads = DEFAULT_THREADS
+        self.q_search_depth = DEFAULT_Q_SEARCH_DEPTH
+        self.own_book = False
+        self.book_file = ''
+        self.cache_file = ''
+        self.engine = None
+        self.search_thread = None
+        self.stop_event = threading.Event()
+
+    def send(self, line: str):
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def get_engine(self):
+        if self.engine is None:
+            book_path = self.book_file if self.own_book and self.book_file else None
+            try:
+                self.engine = Engine(float('Inf'), self.q_search_depth, self.hash_mb, threads=self.threads,
+                                     book_path=book_path, cache_path=self.cache_file or None)
+            except (OSError, ValueError) as e:
+                self.send(f'info string cannot open {e.filename}' if isinstance(e, OSError) else f'info string {e}')
+                self.engine = Engine(float('Inf'), self.q_search_depth, self.hash_mb, threads=self.threads)
+        return self.engine
+
+    def reset_engine(self):
+        self.stop()
+        if self.engine is not None:
+            self.engine.close()
+            self.engine = None
+
+    def stop(self):
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+    def loop(self, input=sys.stdin):
+        # the search runs on its own thread, so this loop keeps reading commands such as stop while it thinks
+        for line in input:
+            if not self.handle(line):
+                break
+        self.reset_engine()
+
+    def handle(self, line: str):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == 'uci':
+            self.send(f'id name {ENGINE_NAME}')
+            self.send(f'id author {ENGINE_AUTHOR}')
+            self.send(f'option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}')
+            self.send(f'option name Threads type spin default {DEFAULT_THREADS} min 1 max {MAX_THREADS}')
+            self.send(f'option name QSearchDepth type spin default {DEFAULT_Q_SEARCH_DEPTH} min 0 max 16')
+            self.send('option name OwnBook type check default false')
+            self.send('option name BookFile type string default <empty>')
+            self.send('option name CacheFile type string default <empty>')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            self.set_option(tokens[1:])
+        elif command == 'ucinewgame':
+            self.stop()
+            if self.engine is not None:
+                self.engine.clear()
+        elif command == 'position':
+            self.stop()
+            self.set_position(tokens[1:])
+        elif command == 'go':
+            self.stop()
+            self.go(parse_go(tokens[1:], self.send))
+        elif command == 'stop':
+            self.stop()
+        elif command == 'quit':
+            return False
+        return True
+
+    def set_option(self, tokens: list):
+        if 'name' not in tokens or 'value' not in tokens:
+            return None
+        name = ' '.join(tokens[tokens.index('name') + 1:tokens.index('value')]).lower()
+        value = ' '.join(tokens[tokens.index('value') + 1:])
+        try:
+            if name == 'hash':
+                self.hash_mb = min(max(int(value), 1), MAX_HASH_MB)
+                self.reset_engine()
+            elif name == 'threads':
+                self.threads = min(max(int(value), 1), MAX_THREADS)
+                self.reset_engine()
+            elif name == 'qsearchdepth':
+                self.q_search_depth = max(int(value), 0)
+                if self.engine is not None:
+                    self.engine.q_search_depth = self.q_search_depth
+            elif name == 'ownbook':
+                self.own_book = value.lower() == 'true'
+                self.reset_engine()
+            elif name == 'bookfile':
+                self.book_file = '' if value == '<empty>' else value
+                self.reset_engine()
+            elif name == 'cachefile':
+                self.cache_file = '' if value == '<empty>' else value
+                self.reset_engine()
+        except ValueError:
+            self.send(f'info string invalid value {value} for option {name}')
+
+    def set_position(self, tokens: list):
+        if not tokens:
+            return None
+        if 'moves' in tokens:
+            moves = tokens[tokens.index('moves') + 1:]
+            tokens = tokens[:tokens.index('moves')]
+        else:
+            moves = []
+        # the previous position is kept when the FEN or one of the moves is invalid
+        try:
+            if tokens[0] == 'startpos':
+                board = chess.Board()
+            elif tokens[0] == 'fen':
+                board = chess.Board(' '.join(tokens[1:]))
+            else:
+                return None
+            for move in moves:
+                board.push_uci(move)
+        except ValueError as e:
+            self.send(f'info string invalid position: {e}')
+            return None
+        self.board = board
+
+    def go(self, limits: dict):
+        self.stop_event.clear()
+        # created here rather than on the search thread: forking Lazy SMP helpers from a second thread
+        # can deadlock on the stdin lock held by this one
+        engine = self.get_engine()
+        self.search_thread = threading.Thread(target=self.search, args=(engine, self.board.copy(), limits),
+                                              daemon=True)
+        self.search_thread.start()
+
+    def search(self, engine: Engine, board: chess.Board, limits: dict):
+        def on_iteration(search_info):
+            nodes = search_info.nodes + search_info.qnodes
+            elapsed = search_info.time
+            nps = int(nodes / elapsed) if elapsed > 0 else 0
+            pv = ' '.join(move.uci() for move in search_info.pv)
+            self.send(f'info depth {search_info.depth} score {format_score(search_info.score)} nodes {nodes} '
+                      f'nps {nps} time {int(elapsed * 1000)} pv {pv}')
+
+        move = None
+        try:
+            move = engine.play(board, stop_event=self.stop_event, on_iteration=on_iteration,
+                               time_limit=allocate_time(limits, board.turn), max_depth=limits.get('depth', MAX_DEPTH),
+                               max_nodes=limits.get('nodes')).best_move
+            if limits.get('infinite'):
+                # in infinite mode bestmove may only be sent after stop
+                self.stop_event.wait()
+        finally:
+            # the GUI waits for bestmove even when the search failed
+            if move is None:
+                move = next(iter(board.legal_moves), None)
+            self.send(f'bestmove {move.uci() if move is not None else "0000"}')
+            # off the clock now that the GUI has the move
+            engine.flush_cache()
+
+
+if __name__ == '__main__':
+    UCI().loop()
@@ -0,0 +1,92 @@
+import chess
+from chess.polyglot import POLYGLOT_RANDOM_ARRAY, zobrist_hash
+
+
+# set to True to cross-check every incrementally updated key against a full zobrist_hash
+DEBUG = False
+
+# PIECE_KEYS[color][piece_type][square], same layout as chess.polyglot
+PIECE_KEYS = [[[0] * 64 for _ in range(7)] for _ in chess.COLORS]
+for _color in chess.COLORS:
+    for _piece_type in chess.PIECE_TYPES:
+        for _square in chess.SQUARES:
+            PIECE_KEYS[_color][_piece_type][_square] = \
+                POLYGLOT_RANDOM_ARRAY[64 * ((_piece_type - 1) * 2 + int(_color)) + _square]
+
+CASTLING_CORNERS = ((chess.BB_H1, 768), (chess.BB_A1, 769), (chess.BB_H8, 770), (chess.BB_A8, 771))
+CASTLING_MASK = chess.BB_H1 | chess.BB_A1 | chess.BB_H8 | chess.BB_A8
+CASTLING_KEYS = {}
+for _rights in range(16):
+    _bb = 0
+    _key = 0
+    for _i, (_corner, _index) in enumerate(CASTLING_CORNERS):
+        if _rights & (1 << _i):
+            _bb |= _corner
+            _key ^= POLYGLOT_RANDOM_ARRAY[_index]
+    CASTLING_KEYS[_bb] = _key
+
+EP_KEYS = POLYGLOT_RANDOM_ARRAY[772:780]
+TURN_KEY = POLYGLOT_RANDOM_ARRAY[780]
+
+# rook from/to squares indexed by the king's destination when castling
+CASTLING_ROOKS = {
+    chess.G1: (chess.H1, chess.F1),
+    chess.C1: (chess.A1, chess.D1),
+    chess.G8: (chess.H8, chess.F8),
+    chess.C8: (chess.A8, chess.D8),
+}
+
+
+def ep_key(board: chess.Board):
+    ep_square = board.ep_square
+    if ep_square:
+        # only hashed when a pawn of the side to move stands next to the double-pushed pawn
+        if board.turn == chess.WHITE:
+            ep_mask = chess.shift_down(chess.BB_SQUARES[ep_square])
+        else:
+            ep_mask = chess.shift_up(chess.BB_SQUARES[ep_square])
+        ep_mask = chess.shift_left(ep_mask) | chess.shift_right(ep_mask)
+        if ep_mask & board.pawns & board.occupied_co[board.turn]:
+            return EP_KEYS[ep_square & 7]
+    return 0
+
+
+def push(board: chess.Board, move: chess.Move, key: int):
+    turn = board.turn
+    from_square = move.from_square
+    to_square = move.to_square
+    piece_type = board.piece_type_at(from_square)
+    own_keys = PIECE_KEYS[turn]
+
+    key ^= TURN_KEY ^ CASTLING_KEYS[board.castling_rights & CASTLING_MASK] ^ ep_key(board)
+    key ^= own_keys[piece_type][from_square]
+    if move.promotion is not None:
+        key ^= own_keys[move.promotion][to_square]
+    else:
+        key ^= own_keys[piece_type][to_square]
+
+    captured = board.piece_type_at(to_square)
+    if captured is not None:
+        key ^= PIECE_KEYS[not turn][captured][to_square]
+    elif piece_type == chess.PAWN and to_square == board.ep_square:
+        ep_capture = to_square - 8 if turn == chess.WHITE else to_square + 8
+        key ^= PIECE_KEYS[not turn][chess.PAWN][ep_capture]
+    elif piece_type == chess.KING and abs(to_square - from_square) == 2:
+        rook_from, rook_to = CASTLING_ROOKS[to_square]
+        key ^= own_keys[chess.ROOK][rook_from] ^ own_keys[chess.ROOK][rook_to]
+
+    board.push(move)
+    return key ^ CASTLING_KEYS[board.castling_rights & CASTLING_MASK] ^ ep_key(board)
+
+
+def push_null(board: chess.Board, key: int):
+    # passes the turn, only the side to move and the en passant square change
+    key ^= TURN_KEY ^ ep_key(board)
+    board.push(chess.Move.null())
+    return key
+
+
+def verify(board: chess.Board, key: int):
+    expected = zobrist_hash(board) if isinstance(board, chess.Board) else board.compute_key()
+    if key != expected:
+        raise AssertionError(f'Incremental zobrist key {key:016x} != {expected:016x} for {board.fen()}')
@@ -29,6 +29,8 @@ class Square(QLabel):
         self.setPixmap(self.pixmap)
 
     def mousePressEvent(self, event):
+        if self.board.app.engine_worker is not None:
+            return None
         if self.move is None:
             self.board.show_legal_moves(self.sq_id)
         else:
@@ -68,35 +70,8 @@ class Square(QLabel):
                 self.board.app.controls.resign_btn.setEnabled(False)
                 return None
             if self.board.app.engine is not None:
-                move, value, depth = self.board.app.engine.play(self.board.board)
-                if move is not None:
-                    if self.board.board.is_capture(move) or self.board.board.is_en_passant(move):
-                        if not self.board.board.is_en_passant(move):
-                            cpt_piece = self.board.board.piece_at(move.to_square)
-                        else:
-                            cpt_color = not self.board.board.turn
-                            cpt_piece = chess.Piece(chess.PAWN, cpt_color)
-                        if cpt_piece.color:
-                            self.board.app.captures_1.add_piece(cpt_piece)
-                        else:
-                            self.board.app.captures_2.add_piece(cpt_piece)
-                    self.board.board.push(move)
-                    self.board.render()
-                    num_moves = len(self.board.board.move_stack)
-                    self.board.app.controls.search_stats.add_stats(num_moves, value, depth)
-                if self.board.board.is_game_over():
-                    winner = "Draw"
-                    if self.board.board.outcome():
-                        if self.board.board.outcome().winner is not None:
-                            if not self.board.mirror:
-                                winner = 'Black'
-                            else:
-                                winner = 'White'
-                    msg = QMessageBox(0, "Winner", winner, QMessageBox.Ok)
-                    msg.exec()
-                    self.board.app.controls.start_btn.setEnabled(True)
-                    self.board.app.controls.resign_btn.setEnabled(False)
-                
+                self.board.app.start_engine_move()
+
     def highlight_1(self, move=None):
         self.setStyleSheet(f"background-color : {self.bg_color}; background-image: url('imgs/selection.png')")
         self.highlighted = True
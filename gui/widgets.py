@@ -2,47 +2,79 @@ from PyQt5.QtCore import QSize, Qt
 from PyQt5.QtWidgets import QCheckBox, QFormLayout, QHBoxLayout, QLabel, QLineEdit, QMainWindow, QMessageBox, QPushButton, QVBoxLayout, QWidget
 from PyQt5.QtGui import QPixmap
 import chess
-from engine.playing import Engine
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import matplotlib.pyplot as plt
+from engine.core import Engine
 from gui.chessboard import ChessBoard, get_piece_img
+from gui.worker import EngineWorker
+
+
+STATS_TITLES = ("Score", "Depth", "Nodes")
+
+
+def search_plot_values(search_info):
+    return search_info.score, search_info.depth, search_info.nodes + search_info.qnodes
+
+
+def describe_search(search_info):
+    nodes = search_info.nodes + search_info.qnodes
+    nps = nodes / search_info.time if search_info.time > 0 else 0
+    tt_hit_rate = search_info.tt_hits / search_info.tt_probes if search_info.tt_probes else 0
+    pv = " ".join(move.uci() for move in search_info.pv[:6])
+    return f"Depth: {search_info.depth}, Score: {search_info.score}, Nodes: {nodes} " \
+           f"({search_info.qnodes} qsearch), NPS: {nps:.0f}\n" \
+           f"TT hits: {tt_hit_rate:.0%}, TT cutoffs: {search_info.tt_cutoffs}, " \
+           f"First move cutoffs: {search_info.first_move_cutoff_rate:.0%}\n" \
+           f"Eval cache hits: {search_info.eval_cache_hit_rate:.0%}, " \
+           f"Pawn hash hits: {search_info.pawn_hash_hit_rate:.0%}\nPV: {pv}"
 
 
 class SearchStats(QWidget):
     def __init__(self):
         super().__init__()
-        plt.subplots_adjust(left=None, bottom=None, right=None, top=None, wspace=None, hspace=1.)
-        self.figure, self.axs = plt.subplots(2, 1, sharex=True)
+        # matplotlib is imported when the first window is built, not when the gui package is imported
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+        self.figure = Figure()
+        self.figure.subplots_adjust(hspace=1.)
+        self.axs = self.figure.subplots(3, 1, sharex=True)
         self.canvas = FigureCanvas(self.figure)
-        self.axs[0].title.set_text("Value")
-        self.axs[1].title.set_text("Depth")
+        for ax, title in zip(self.axs, STATS_TITLES):
+            ax.title.set_text(title)
+        self.progress_label = QLabel()
+        self.progress_label.setWordWrap(True)
         layout = QVBoxLayout()
         layout.addWidget(self.canvas)
+        layout.addWidget(self.progress_label)
         self.setLayout(layout)
-        self.setFixedSize(QSize(400, 300))
+        self.setFixedSize(QSize(400, 450))
 
     def reset(self):
-        self.value_data = [[], []]
-        self.depth_data = [[], []]
-        self.axs[0].clear()
-        self.axs[1].clear()
-        self.axs[0].title.set_text("Value")
-        self.axs[1].title.set_text("Depth")
-        self.canvas.draw()
-
-    def add_stats(self, move, value, depth=None):
-        self.value_data[0].append(move)
-        self.value_data[1].append(value)
-        if depth is not None:
-            self.depth_data[0].append(move)
-            self.depth_data[1].append(depth)
-        self.axs[0].clear()
-        self.axs[1].clear()
-        self.axs[0].plot(self.value_data[0], self.value_data[1])
-        self.axs[1].plot(self.depth_data[0], self.depth_data[1])
-        self.axs[0].title.set_text("Value")
-        self.axs[1].title.set_text("Depth")
-        self.canvas.draw()
+        self.moves = []
+        # score, depth, nodes of every engine move
+        self.data = [[], [], []]
+        self.progress_label.setText("")
+        self.draw()
+
+    def draw(self, live=None):
+        for ax, values, title in zip(self.axs, self.data, STATS_TITLES):
+            ax.clear()
+            ax.plot(self.moves, values)
+            ax.title.set_text(title)
+        if live is not None:
+            move, search_info = live
+            for ax, value in zip(self.axs, search_plot_values(search_info)):
+                ax.plot([move], [value], "o")
+        self.canvas.draw_idle()
+
+    def add_stats(self, move, search_info):
+        self.moves.append(move)
+        for values, value in zip(self.data, search_plot_values(search_info)):
+            values.append(value)
+        self.progress_label.setText(describe_search(search_info))
+        self.draw()
+
+    def show_progress(self, move, search_info):
+        self.progress_label.setText(describe_search(search_info))
+        self.draw(live=(move, search_info))
 
 
 class Controls(QWidget):
@@ -55,13 +87,17 @@ class Controls(QWidget):
         self.white = QCheckBox() 
         self.time_limit = QLineEdit("1")
         self.q_search_depth = QLineEdit("3")
-        self.transp_table_size = QLineEdit("1e5")
+        self.transp_table_mb = QLineEdit("64")
+        self.book_path = QLineEdit("")
+        self.cache_path = QLineEdit("")
         self.form_layout = QFormLayout()
         self.form_layout.addRow(QLabel("FEN"), self.start_fen_text)
         self.form_layout.addRow(QLabel("Engine White"), self.white)
         self.form_layout.addRow(QLabel("Move Time Limit (sec.)"), self.time_limit)
         self.form_layout.addRow(QLabel("Quiesc. Search Depth"), self.q_search_depth)
-        self.form_layout.addRow(QLabel("Transp. Table Size"), self.transp_table_size)
+        self.form_layout.addRow(QLabel("Transp. Table Size (MB)"), self.transp_table_mb)
+        self.form_layout.addRow(QLabel("Opening Book (.bin)"), self.book_path)
+        self.form_layout.addRow(QLabel("Analysis Cache File"), self.cache_path)
         self.start_btn = QPushButton("Start")
         self.start_btn.setFixedSize(QSize(100, 70))
         self.start_btn.clicked.connect(self.start_match)
@@ -78,6 +114,7 @@ class Controls(QWidget):
         self.setLayout(layout)
 
     def start_match(self):
+        self.app.cancel_engine_move()
         black = False
         if self.white.isChecked():
             black = True
@@ -85,35 +122,32 @@ class Controls(QWidget):
             self.app.board.reset(fen=self.start_fen_text.text(), mirror=black)
             time_limit = float(self.time_limit.text())
             q_search_depth = int(self.q_search_depth.text())
-            transp_table_size = int(float(self.transp_table_size.text()))
-            self.app.engine = Engine(time_limit, q_search_depth, transp_table_size)
-        except:
+            transp_table_mb = float(self.transp_table_mb.text())
+            if self.app.engine is not None:
+                # flushes the analysis cache of the previous game before it is opened again
+                self.app.engine.close()
+                self.app.engine = None
+            self.app.engine = Engine(time_limit, q_search_depth, transp_table_mb,
+                                     book_path=self.book_path.text().strip() or None,
+                                     cache_path=self.cache_path.text().strip() or None)
+        except (ValueError, OSError):
             QMessageBox.critical(self, "Error", "Invalid settings!")
             return None
         self.start_btn.setEnabled(False)
         self.resign_btn.setEnabled(True)
         self.search_stats.reset()
         if self.app.engine is not None and self.app.board.mirror:
-            move, value, depth = self.app.engine.play(self.app.board.board)
-            if self.app.board.board.is_capture(move) or self.app.board.board.is_en_passant(move):
-                if not self.app.board.board.is_en_passant(move):
-                    cpt_piece = self.app.board.board.piece_at(move.to_square)
-                else:
-                    cpt_color = not self.app.board.board.turn
-                    cpt_piece = chess.Piece(chess.PAWN, cpt_color)
-                if cpt_piece.color:
-                    self.app.captures_1.add_piece(cpt_piece)
-                else:
-                    self.app.captures_2.add_piece(cpt_piece)
-            self.app.board.board.push(move)
-            self.app.board.render()
+            self.app.start_engine_move()
 
     def resign(self):
+        self.app.cancel_engine_move()
         if self.app.board.mirror:
             winner = "White"
         else:
             winner = "Black"
         QMessageBox.about(self, "Winner", winner)
+        if self.app.engine is not None:
+            self.app.engine.close()
         self.app.engine = None
         self.start_btn.setEnabled(True)
         self.resign_btn.setEnabled(False)
@@ -171,3 +205,62 @@ class ChessApp(QWidget):
         self.setLayout(self.h_layout)
 
         self.engine = None
+        self.engine_worker = None
+
+    def start_engine_move(self):
+        self.engine_worker = EngineWorker(self.engine, self.board.board)
+        # bound methods of a main-thread widget, so both signals are delivered through queued connections
+        self.engine_worker.progress.connect(self.show_engine_progress)
+        self.engine_worker.result.connect(self.apply_engine_move)
+        self.engine_worker.start()
+
+    def show_engine_progress(self, search_info):
+        if self.sender() is not self.engine_worker:
+            return None
+        num_moves = len(self.board.board.move_stack) + 1
+        self.controls.search_stats.show_progress(num_moves, search_info)
+
+    def cancel_engine_move(self):
+        if self.engine_worker is not None:
+            self.engine_worker.cancel()
+            self.engine_worker = None
+
+    def apply_engine_move(self, search_info):
+        if self.sender() is not self.engine_worker:
+            return None
+        self.engine_worker = None
+        board = self.board.board
+        move = search_info.best_move
+        if move is not None:
+            if board.is_capture(move) or board.is_en_passant(move):
+                if not board.is_en_passant(move):
+                    cpt_piece = board.piece_at(move.to_square)
+                else:
+                    cpt_color = not board.turn
+                    cpt_piece = chess.Piece(chess.PAWN, cpt_color)
+                if cpt_piece.color:
+                    self.captures_1.add_piece(cpt_piece)
+                else:
+                    self.captures_2.add_piece(cpt_piece)
+            board.push(move)
+            self.board.render()
+            num_moves = len(board.move_stack)
+            self.controls.search_stats.add_stats(num_moves, search_info)
+        if board.is_game_over():
+            winner = "Draw"
+            if board.outcome():
+                if board.outcome().winner is not None:
+                    if not self.board.mirror:
+                        winner = 'Black'
+                    else:
+                        winner = 'White'
+            msg = QMessageBox(0, "Winner", winner, QMessageBox.Ok)
+            msg.exec()
+            self.controls.start_btn.setEnabled(True)
+            self.controls.resign_btn.setEnabled(False)
+
+    def closeEvent(self, event):
+        self.cancel_engine_move()
+        if self.engine is not None:
+            self.engine.close()
+        super().closeEvent(event)
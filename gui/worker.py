@@ -0,0 +1,24 @@
+import threading
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class EngineWorker(QThread):
+    # SearchInfo of every completed iteration
+    progress = pyqtSignal(object)
+    # SearchInfo returned by Engine.play
+    result = pyqtSignal(object)
+
+    def __init__(self, engine, board):
+        super().__init__()
+        self.engine = engine
+        self.board = board.copy()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        search_info = self.engine.play(self.board, stop_event=self.stop_event, on_iteration=self.progress.emit)
+        if not self.stop_event.is_set():
+            self.result.emit(search_info)
+
+    def cancel(self):
+        self.stop_event.set()
+        self.wait()
@@ -0,0 +1,24 @@
+import io
+import chess.engine
+import chess.pgn
+from engine.annotate import annotate_game, game_offsets
+
+
+# games ending in mate, the mating move must be annotated as a mate for the side that played it
+MATING_GAMES = ('1. e4 e5 2. Bc4 Nc6 3. Qh5 Nf6 4. Qxf7# 1-0', '1. f3 e5 2. g4 Qh4# 0-1')
+SEARCH_ARGS = {'transp_tab_mb': 1, 'q_search_depth': 2, 'time_limit': float('Inf'), 'max_depth': 2,
+               'max_nodes': None}
+
+
+def test_mating_move_is_annotated_as_mate(tmp_path):
+    pgn_path = str(tmp_path / 'mates.pgn')
+    with open(pgn_path, 'w') as f:
+        f.write('\n\n'.join(MATING_GAMES) + '\n')
+    offsets = list(game_offsets(pgn_path))
+    assert len(offsets) == len(MATING_GAMES)
+    for offset in offsets:
+        text = annotate_game((pgn_path, offset, SEARCH_ARGS, 200, 'pgn'))[2]
+        last_node = chess.pgn.read_game(io.StringIO(text)).end()
+        assert '[%eval #0]' in last_node.comment
+        # the side that played the last move is not to move after it
+        assert last_node.eval().pov(not last_node.turn()) == chess.engine.MateGiven
@@ -0,0 +1,17 @@
+import chess
+from engine.bench import BENCH_FENS
+from engine.evaluation import evaluate_board, evaluate_board_bitboards
+from engine.batch_eval import evaluate_batch
+
+
+def test_bitboard_eval_matches_evaluate_board():
+    for fen in BENCH_FENS:
+        board = chess.Board(fen)
+        assert evaluate_board_bitboards(board) == evaluate_board(board), fen
+
+
+def test_batch_eval_matches_evaluate_board():
+    for fen, value in zip(BENCH_FENS, evaluate_batch(BENCH_FENS).tolist()):
+        board = chess.Board(fen)
+        if not board.is_game_over():
+            assert value == evaluate_board(board), fen
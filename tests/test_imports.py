@@ -0,0 +1,18 @@
+import os
+import subprocess
+import sys
+import pytest
+from engine.bench import HEADLESS_MODULES, HEAVY_MODULES
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('module', HEADLESS_MODULES)
+def test_headless_import(module):
+    # imported by a fresh interpreter, how long it takes is reported by python -m engine.bench --imports
+    code = (f'import sys; import {module}; '
+            f'print(" ".join(sorted({{name.split(".")[0] for name in sys.modules}} & {set(HEAVY_MODULES)!r})))')
+    loaded = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True,
+                            check=True).stdout.strip()
+    assert not loaded, f'{module} loads {loaded}'
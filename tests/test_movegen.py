@@ -0,0 +1,46 @@
+import random
+import chess
+from chess.polyglot import zobrist_hash
+from engine.bench import BENCH_FENS
+from engine.movegen import Position, PERFT_SUITE
+from engine.search import search, TranspTable
+
+
+def test_perft_suite():
+    for fen, expected_counts in PERFT_SUITE:
+        position = Position(fen)
+        for depth, expected in enumerate(expected_counts[:2], start=1):
+            assert position.perft(depth) == expected, (fen, depth)
+        assert position.fen() == chess.Board(fen).fen(en_passant='fen')
+
+
+def test_matches_chess_board_along_random_games():
+    # the drop-in methods must agree with python-chess, including the order of the legal moves
+    rng = random.Random(0)
+    for fen, _ in PERFT_SUITE:
+        board = chess.Board(fen)
+        position = Position.from_board(board)
+        for _ in range(60):
+            moves = list(board.legal_moves)
+            assert position.legal_moves == moves, board.fen()
+            assert position.generate_legal_captures() == list(board.generate_legal_captures()), board.fen()
+            assert (position.is_check(), position.is_checkmate(), position.is_game_over()) \
+                == (board.is_check(), board.is_checkmate(), board.is_game_over()), board.fen()
+            assert position.key == zobrist_hash(board)
+            if not moves:
+                break
+            move = rng.choice(moves)
+            assert position.gives_check(move) == board.gives_check(move)
+            board.push(move)
+            position.push(move)
+        while board.move_stack:
+            assert position.pop() == board.pop()
+        assert position.fen() == board.fen(en_passant='fen')
+
+
+def test_native_board_searches_the_same_tree():
+    for fen in BENCH_FENS[::9]:
+        board = chess.Board(fen)
+        plain, native = [search(board, board.turn, TranspTable(1), 2, float('Inf'), max_depth=3,
+                                native_board=native_board) for native_board in (False, True)]
+        assert (native.best_move, native.nodes, native.qnodes) == (plain.best_move, plain.nodes, plain.qnodes), fen
@@ -0,0 +1,52 @@
+import chess
+from engine.transp_table import TranspTable, EXACT, LOWERBOUND, UPPERBOUND
+
+
+KEY = 0x123456789ABCDEF
+DEEP_MOVE = chess.Move.from_uci('e2e4')
+SHALLOW_MOVE = chess.Move.from_uci('d2d4')
+
+
+def test_shallow_bound_keeps_deep_entry():
+    transp_table = TranspTable(1)
+    transp_table.store(KEY, 30, LOWERBOUND, 8, DEEP_MOVE)
+    transp_table.store(KEY, -20, UPPERBOUND, 1, SHALLOW_MOVE)
+    res = transp_table.lookup(KEY)
+    assert (res.value, res.flag, res.depth, res.best_move) == (30, LOWERBOUND, 8, DEEP_MOVE)
+
+
+def test_shallow_exact_keeps_deep_entry():
+    transp_table = TranspTable(1)
+    transp_table.store(KEY, 15, EXACT, 9, DEEP_MOVE)
+    transp_table.store(KEY, 40, EXACT, 1, SHALLOW_MOVE)
+    res = transp_table.lookup(KEY)
+    assert (res.value, res.depth, res.best_move) == (15, 9, DEEP_MOVE)
+
+
+def test_same_depth_replaces_entry():
+    transp_table = TranspTable(1)
+    transp_table.store(KEY, 10, LOWERBOUND, 6, DEEP_MOVE)
+    transp_table.store(KEY, 25, EXACT, 6, None)
+    res = transp_table.lookup(KEY)
+    assert (res.value, res.flag, res.depth, res.best_move) == (25, EXACT, 6, DEEP_MOVE)
+
+
+def test_stale_entry_is_replaced():
+    transp_table = TranspTable(1)
+    transp_table.store(KEY, 15, EXACT, 9, DEEP_MOVE)
+    transp_table.new_search()
+    transp_table.store(KEY, 40, EXACT, 1, SHALLOW_MOVE)
+    res = transp_table.lookup(KEY)
+    assert (res.value, res.depth, res.best_move) == (40, 1, SHALLOW_MOVE)
+
+
+def test_export_selects_deep_entries_of_current_search():
+    transp_table = TranspTable(1)
+    transp_table.store(KEY + 1, 5, EXACT, 7, None)
+    transp_table.new_search()
+    transp_table.store(KEY, -15, UPPERBOUND, 4, DEEP_MOVE)
+    transp_table.store(KEY + 2, 20, EXACT, 1, SHALLOW_MOVE)
+    keys, scores, moves, depths, flags = transp_table.export(min_depth=2)
+    assert keys.tolist() == [KEY]
+    assert (scores.tolist(), depths.tolist(), flags.tolist()) == ([-15], [4], [UPPERBOUND])
+    assert moves.tolist() == [DEEP_MOVE.from_square | (DEEP_MOVE.to_square << 6)]